@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List
+
+from agents.paths import data_path
+from agents.session_registry import SessionRegistry
+
+_logs = SessionRegistry()
+
+# Fields kept from a change entry; `type` and `details` are required
+ENTRY_FIELDS = ('type', 'timestamp', 'userId', 'details')
+
+
+class ChangeLog:
+    """Append-only, per-session log of requirement changes.
+
+    Every change is appended as one JSON line to `<session>.log`. Only the folded state is
+    held in memory: each requirement's current version and the log offsets of its changes,
+    which `history` reads back from the log. Every `snapshot_every` events that state is
+    written to `<session>.snapshot.json` together with the log offset it covers, so opening
+    a session only replays the tail of the log. The log itself is never rewritten.
+    """
+
+    def __init__(self, session_id: str, log_dir: str = None, snapshot_every: int = None):
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', session_id or ''):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        self.session_id = session_id
+        self.log_dir = log_dir or data_path(os.getenv('CHANGE_LOG_FOLDER', 'change_logs'))
+        self.snapshot_every = snapshot_every or int(os.getenv('CHANGE_LOG_SNAPSHOT_EVERY', 100))
+        self.log_path = os.path.join(self.log_dir, f'{session_id}.log')
+        self.snapshot_path = os.path.join(self.log_dir, f'{session_id}.snapshot.json')
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._events = 0
+        self._snapshot_events = 0
+        self._versions = {}
+        self._positions = {}  # requirement id -> log offsets of its changes
+        self._load_snapshot()
+
+    @classmethod
+    def for_session(cls, session_id: str) -> 'ChangeLog':
+        """Return the shared change log for a session."""
+        return _logs.get(session_id, cls)
+
+    def append(self, requirement_id: str, entry: Dict) -> int:
+        """Append a change for a requirement and return the requirement's new version.
+
+        Raises ValueError for an entry without string `type` and `details`.
+        """
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(f), str) for f in ('type', 'details')):
+            raise ValueError("A change entry needs string 'type' and 'details' fields")
+        with self._lock:
+            self._replay()
+            version = self._versions.get(requirement_id, 0) + 1
+            event = {field: entry[field] for field in ENTRY_FIELDS if field in entry}
+            event['requirementId'] = requirement_id
+            event['version'] = version
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+            self._replay()
+            if self._events - self._snapshot_events >= self.snapshot_every:
+                self._write_snapshot()
+            return version
+
+    def history(self, requirement_id: str) -> List[Dict]:
+        """Return the full change history of a requirement, oldest first."""
+        with self._lock:
+            self._replay()
+            positions = list(self._positions.get(requirement_id, []))
+        history = []
+        if positions:
+            with open(self.log_path, 'rb') as f:
+                for position in positions:
+                    f.seek(position)
+                    event = json.loads(f.readline())
+                    event.pop('requirementId')
+                    history.append(event)
+        return history
+
+    def version(self, requirement_id: str) -> int:
+        """Return the current version of a requirement (0 if it has no changes)."""
+        with self._lock:
+            self._replay()
+            return self._versions.get(requirement_id, 0)
+
+    def _load_snapshot(self) -> None:
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._offset = snapshot['offset']
+            self._events = self._snapshot_events = snapshot['events']
+            self._versions = snapshot['versions']
+            self._positions = snapshot['positions']
+        except Exception as e:
+            print(f"Ignoring unreadable change log snapshot {self.snapshot_path}: {str(e)}")
+            self._offset = self._events = self._snapshot_events = 0
+            self._versions, self._positions = {}, {}
+
+    def _replay(self) -> None:
+        """Apply events appended since the last replay (including by other processes)."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written line, pick it up next time
+                event = json.loads(line)
+                requirement_id = event['requirementId']
+                self._versions[requirement_id] = event['version']
+                self._positions.setdefault(requirement_id, []).append(self._offset)
+                self._offset += len(line)
+                self._events += 1
+
+    def _write_snapshot(self) -> None:
+        """Write the folded state atomically."""
+        tmp_path = f'{self.snapshot_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'offset': self._offset,
+                'events': self._events,
+                'versions': self._versions,
+                'positions': self._positions,
+            }, f)
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot_events = self._events
@@ -0,0 +1,220 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetEncoder:
+    """Encodes DataFrames into compact, representative prompt text.
+
+    Each sheet is written as per-column summaries followed by a delimited table (header
+    once, one line per row). Rows are chosen to cover nulls, numeric extremes and the most
+    frequent categorical values, then spread evenly over the rest of the sheet. They are
+    kept in that priority order, so when the token budget cuts rows the coverage rows
+    survive, and the rows that fit are shown in sheet order. The budget is a cap: wide sheets lose columns
+    and rows, and sheets beyond what the budget can describe are only named.
+    """
+
+    DELIMITER = '|'
+
+    def __init__(self, token_budget: Optional[int] = None, max_sample_rows: int = 20,
+                 max_categories: int = 5, max_cell_chars: int = 40, min_sheet_tokens: int = 60):
+        self.token_budget = token_budget or int(os.getenv('DATASET_PROMPT_TOKEN_BUDGET', 1500))
+        self.min_sheet_tokens = min_sheet_tokens
+        self.max_sample_rows = max_sample_rows
+        self.max_categories = max_categories
+        self.max_cell_chars = max_cell_chars
+
+    def describe(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Summarize a DataFrame into the dataset_info entry used for prompts."""
+        positions = self.sample_positions(df, self.max_sample_rows)
+        sample = df.iloc[positions]
+        return {
+            'columns': [self._sanitize(str(c)) for c in df.columns],
+            'column_summaries': self.summarize(df),
+            # Most important rows first; `sample_positions` restores sheet order for display
+            'sample_rows': [[self._format_cell(v) for v in row]
+                            for row in sample.itertuples(index=False, name=None)],
+            'sample_positions': [int(p) for p in positions],
+            'total_rows': len(df)
+        }
+
+    def summarize(self, df: pd.DataFrame) -> List[str]:
+        """Return a one-line summary per column."""
+        null_counts = df.isna().sum().to_numpy()
+        summaries = []
+        for (name, s), nulls in zip(df.items(), null_counts):
+            parts = [f"{self._sanitize(str(name))}: {s.dtype}"]
+            if nulls:
+                parts.append(f"{nulls} nulls")
+            distinct = s.nunique(dropna=True)
+            parts.append(f"{distinct} distinct")
+
+            if pd.api.types.is_bool_dtype(s):
+                pass
+            elif pd.api.types.is_numeric_dtype(s) and distinct:
+                parts.append(f"range {self._format_cell(s.min())}..{self._format_cell(s.max())}, "
+                             f"mean {s.mean():.4g}")
+            elif pd.api.types.is_datetime64_any_dtype(s) and distinct:
+                parts.append(f"range {self._format_cell(s.min())}..{self._format_cell(s.max())}")
+            elif distinct:
+                top = s.value_counts(dropna=True).head(self.max_categories)
+                parts.append("top: " + ", ".join(f"{self._format_cell(v)} ({c})" for v, c in top.items()))
+            summaries.append(", ".join(parts))
+        return summaries
+
+    def sample_positions(self, df: pd.DataFrame, n: int) -> np.ndarray:
+        """Pick up to n row positions covering nulls, extremes and common categories.
+
+        Positions are returned most important first: rows covering the most features,
+        then rows spread evenly over the sheet.
+        """
+        total = len(df)
+        if total <= n:
+            return np.arange(total)
+
+        candidates = []
+
+        # First row with a null in each column that has nulls
+        na = df.isna().to_numpy()
+        has_na = na.any(axis=0)
+        candidates.append(na.argmax(axis=0)[has_na])
+
+        for _, s in df.items():
+            if pd.api.types.is_bool_dtype(s):
+                continue
+            if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+                # Extremes are where outliers live
+                values = s.to_numpy()
+                valid = ~pd.isna(values)
+                if valid.any():
+                    positions = np.flatnonzero(valid)
+                    ordered = values[valid]
+                    candidates.append(positions[[ordered.argmin(), ordered.argmax()]])
+            else:
+                # First occurrence of each of the most frequent values
+                codes, _ = pd.factorize(s)
+                present = codes >= 0
+                if not present.any():
+                    continue
+                counts = np.bincount(codes[present])
+                if len(counts) > total // 2:
+                    continue  # Free text or identifiers, not a category
+                top = np.argsort(-counts, kind='stable')[:self.max_categories]
+                _, first = np.unique(codes, return_index=True)
+                first = first[1:] if codes.min() < 0 else first
+                candidates.append(first[top])
+
+        covering = np.concatenate(candidates) if candidates else np.array([], dtype=int)
+        # Rows that cover several features at once are preferred
+        rows, hits = np.unique(covering.astype(int), return_counts=True)
+        chosen = rows[np.argsort(-hits, kind='stable')][:n]
+
+        # Spread the remaining rows evenly over the sheet
+        if len(chosen) < n:
+            spread = np.linspace(0, total - 1, n).astype(int)
+            spread = spread[~np.isin(spread, chosen)][:n - len(chosen)]
+            chosen = np.concatenate([chosen, spread])
+        return chosen.astype(int)
+
+    def encode(self, dataset_info: Dict[str, Dict]) -> str:
+        """Encode parsed dataset info into prompt text within the token budget.
+
+        The budget is split evenly between sheets. When that share would be too small to
+        say anything useful, only the first sheets are encoded and the rest are named.
+        """
+        if not dataset_info:
+            return ""
+        names = list(dataset_info)
+        shown = min(len(names), max(1, self.token_budget // self.min_sheet_tokens))
+        omitted = names[shown:]
+        note = ""
+        if omitted:
+            note = self._fit_items(f"{len(omitted)} more sheets not shown: ", omitted, ", ",
+                                   self.min_sheet_tokens)
+        sheet_budget = (self.token_budget - (self.estimate_tokens(note) if note else 0)) // shown
+        parts = [self._encode_sheet(name, dataset_info[name], sheet_budget) for name in names[:shown]]
+        return "\n\n".join(parts + ([note] if note else []))
+
+    def _encode_sheet(self, sheet_name: str, info: Dict, budget: int) -> str:
+        columns = info['columns']
+        lines = [f"Sheet: {sheet_name} ({info['total_rows']} rows, {len(columns)} columns)"]
+        used = self.estimate_tokens(lines[0])
+
+        # Column details get at most half the budget, so there is room left for rows
+        summaries = info.get('column_summaries') or columns
+        detailed = ["Columns:"] + [f"- {s}" for s in summaries]
+        if sum(self.estimate_tokens(line) for line in detailed) <= (budget - used) // 2:
+            lines += detailed
+        else:
+            # Wide sheet: names only, cut off once they fill their share
+            lines.append(self._fit_items("Columns: ", columns, ", ", (budget - used) // 2))
+        used += sum(self.estimate_tokens(line) for line in lines[1:])
+
+        # The table shows as many leading columns as fit in half of what is left
+        caption_cost = 20
+        width = self._fit_count(columns, self.DELIMITER, (budget - used - caption_cost) // 2)
+        if not width:
+            return "\n".join(lines)
+        header = self.DELIMITER.join(columns[:width])
+        used += caption_cost + self.estimate_tokens(header)
+        # Rows arrive most important first; the ones that fit are shown in sheet order
+        positions = info.get('sample_positions') or range(len(info['sample_rows']))
+        kept = []
+        for position, row in zip(positions, info['sample_rows']):
+            line = self.DELIMITER.join(row[:width])
+            cost = self.estimate_tokens(line)
+            if used + cost > budget:
+                continue
+            kept.append((position, line))
+            used += cost
+        if not kept:
+            return "\n".join(lines)
+        table = [line for _, line in sorted(kept)]
+
+        shown = f"first {width} of {len(columns)} columns, " if width < len(columns) else ""
+        lines.append(f"Sample rows ({len(table)} of {info['total_rows']}, {shown}'{self.DELIMITER}'-delimited):")
+        lines.append(header)
+        lines += table
+        return "\n".join(lines)
+
+    def _fit_count(self, items: List[str], separator: str, budget: int) -> int:
+        """How many leading items fit in `budget` tokens when joined with `separator`."""
+        length = 0
+        for count, item in enumerate(items):
+            length += len(item) + (len(separator) if count else 0)
+            if length // 4 + 1 > budget:
+                return count
+        return len(items)
+
+    def _fit_items(self, prefix: str, items: List[str], separator: str, budget: int) -> str:
+        """`prefix` followed by as many items as fit in `budget` tokens, noting any left out."""
+        count = self._fit_count(items, separator, budget - self.estimate_tokens(prefix) - 5)
+        text = prefix + separator.join(items[:count])
+        if count < len(items):
+            text += f"{separator if count else ''}... (+{len(items) - count} more)"
+        return text
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count (about four characters per token)."""
+        return len(text) // 4 + 1
+
+    def _format_cell(self, value: Any) -> str:
+        if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+            return 'NULL'
+        if isinstance(value, pd.Timestamp):
+            text = value.isoformat() if value.time() != pd.Timestamp(0).time() else value.date().isoformat()
+        elif isinstance(value, (float, np.floating)):
+            text = f"{value:.6g}"
+        else:
+            text = str(value)
+        text = self._sanitize(text)
+        if len(text) > self.max_cell_chars:
+            text = text[:self.max_cell_chars - 3] + '...'
+        return text
+
+    def _sanitize(self, text: str) -> str:
+        """Keep text on one line and out of the way of the table delimiter."""
+        return text.replace(self.DELIMITER, '/').replace('\r', ' ').replace('\n', ' ')
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+MAX_CACHED_DATASETS = 4
+
+# Sheets converted on ingest live next to the upload, in <dataset path>.columnar/
+COLUMNAR_SUFFIX = '.columnar'
+MANIFEST_NAME = 'manifest.json'
+# Uploads are stored as <sha256><extension>
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}$')
+_content_hashes = OrderedDict()
+
+
+def dataset_fingerprint(dataset_path: str) -> Tuple[str, int, int]:
+    """Identify a dataset file by path, size and modification time."""
+    stat = os.stat(dataset_path)
+    return (os.path.abspath(dataset_path), stat.st_size, stat.st_mtime_ns)
+
+
+def dataset_content_hash(dataset_path: str) -> str:
+    """SHA-256 of a dataset file's bytes, read from the name of content-addressed uploads."""
+    stem = os.path.splitext(os.path.basename(dataset_path))[0]
+    if CONTENT_ADDRESSED_NAME.match(stem):
+        return stem
+    key = dataset_fingerprint(dataset_path)
+    with _cache_lock:
+        if key in _content_hashes:
+            return _content_hashes[key]
+    digest = hashlib.sha256()
+    with open(dataset_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    with _cache_lock:
+        _content_hashes[key] = digest.hexdigest()
+        while len(_content_hashes) > MAX_CACHED_DATASETS:
+            _content_hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def read_sheets(dataset_path: str) -> Dict[str, pd.DataFrame]:
+    """Parse every sheet of a CSV or Excel file."""
+    # if csv, read single df
+    if dataset_path.endswith('.csv'):
+        return {"data": _read_csv(dataset_path)}
+    # if excel, read all sheets
+    elif dataset_path.endswith('.xlsx') or dataset_path.endswith('.xls'):
+        return pd.read_excel(dataset_path, sheet_name=None)
+    raise ValueError("Unsupported file type. Please provide a CSV or Excel file.")
+
+
+def _read_csv(dataset_path: str) -> pd.DataFrame:
+    """Parse a CSV, keeping zero-padded codes such as ZIPs as text rather than numbers."""
+    df = pd.read_csv(dataset_path)
+    numeric = [i for i, dtype in enumerate(df.dtypes)
+               if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+    if not numeric:
+        return df
+    raw = pd.read_csv(dataset_path, usecols=numeric, dtype=str)
+    for column in raw.columns:
+        if raw[column].str.strip().str.match(r'^0\d', na=False).any():
+            df[column] = raw[column]
+    return df
+
+
+def convert_to_columnar(dataset_path: str, source_name: str = None) -> None:
+    """Parse a dataset once and store each sheet in a columnar file for later loads.
+
+    Sheets are written as Feather (Arrow IPC) files, which are read back memory-mapped.
+    Sheets with a column mixing value types (say numbers and text), which Arrow could only
+    store by converting values, are pickled instead so they load exactly as parsed; so is
+    every sheet without pyarrow. Either way the spreadsheet is never re-parsed.
+    """
+    directory = dataset_path + COLUMNAR_SUFFIX
+    if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return
+
+    # Converted into a scratch directory and renamed into place, so a partial or
+    # concurrent conversion of the same upload is never read
+    scratch = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(dataset_path)), suffix='.part')
+    try:
+        sheets = []
+        for i, (sheet_name, df) in enumerate(read_sheets(dataset_path).items()):
+            sheet = {'name': sheet_name, 'columns': list(df.columns)}
+            if feather is not None and not _has_mixed_types(df):
+                sheet['file'] = f'{i}.feather'
+                _write_feather(df, os.path.join(scratch, sheet['file']))
+            else:
+                sheet['file'] = f'{i}.pkl'
+                df.to_pickle(os.path.join(scratch, sheet['file']))
+            sheets.append(sheet)
+        with open(os.path.join(scratch, MANIFEST_NAME), 'w') as f:
+            json.dump({'source_name': source_name or os.path.basename(dataset_path), 'sheets': sheets}, f, default=str)
+        os.rename(scratch, directory)
+    except OSError:
+        if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            raise
+    finally:
+        if os.path.exists(scratch):
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _has_mixed_types(df: pd.DataFrame) -> bool:
+    """Whether any object column holds values of more than one type."""
+    return any(df[column].dropna().map(type).nunique() > 1 for column in df.columns[df.dtypes == object])
+
+
+def _write_feather(df: pd.DataFrame, path: str) -> None:
+    # Arrow needs string column names; names are restored from the manifest
+    df = df.set_axis([str(c) for c in df.columns], axis=1)
+    feather.write_feather(df.reset_index(drop=True), path)
+
+
+def _read_manifest(dataset_path: str):
+    try:
+        with open(os.path.join(dataset_path + COLUMNAR_SUFFIX, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_columnar(dataset_path: str, manifest: Dict) -> Dict[str, pd.DataFrame]:
+    directory = dataset_path + COLUMNAR_SUFFIX
+    dfs = {}
+    for sheet in manifest['sheets']:
+        path = os.path.join(directory, sheet['file'])
+        if sheet['file'].endswith('.feather'):
+            df = feather.read_table(path, memory_map=True).to_pandas()
+        else:
+            df = pd.read_pickle(path)
+        dfs[sheet['name']] = df.set_axis(sheet['columns'], axis=1)
+    return dfs
+
+
+def load_dataset(dataset_path: str) -> Dict[str, pd.DataFrame]:
+    """Load every sheet of a dataset file into DataFrames, cached per file version.
+
+    Sheets converted on upload are read from their columnar files; anything else is parsed.
+    The returned DataFrames are shared between callers and must not be modified.
+    """
+    key = dataset_fingerprint(dataset_path)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    manifest = _read_manifest(dataset_path)
+    if manifest and (feather is not None or not any(s['file'].endswith('.feather') for s in manifest['sheets'])):
+        dfs = _read_columnar(dataset_path, manifest)
+    else:
+        dfs = read_sheets(dataset_path)
+
+    with _cache_lock:
+        _cache[key] = dfs
+        while len(_cache) > MAX_CACHED_DATASETS:
+            _cache.popitem(last=False)
+    return dfs
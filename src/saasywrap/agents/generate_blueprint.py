@@ -2,10 +2,34 @@ import openai
 from typing import List, Dict, Any, Optional
 import os
 from datetime import datetime
+from agents.model_router import router
+from agents.generate_schema import SchemaAgent
+from agents.generate_form import FormAgent
+from agents.generate_dashboard import DashboardAgent
+from agents.generate_view import ViewAgent
+from agents.preview_db import PreviewDatabase
+from agents.requirement_index import RequirementIndex
+
+# Requirements outside a transform's own that are added to its prompt for context
+RELATED_TRANSFORM_REQUIREMENTS = 2
+
+
+def transform_requirements(transform: Dict, requirements: List[Dict], session_id: Optional[str] = None) -> List[Dict]:
+    """A transform's own requirements plus the few most closely related ones, as prompts see them."""
+    return RequirementIndex.for_session(session_id).select(
+        requirements,
+        f"{transform.get('title', '')} {transform.get('description', '')}",
+        set(transform.get('requirement_ids', [])),
+        k=RELATED_TRANSFORM_REQUIREMENTS
+    )
+
 
 class BlueprintAgent:
     def __init__(self):
         self.blueprint = []
+        self.requirements = []
+        self.dataset_path = None
+        self.session_id = None
         self.conversation_history = []
         self.client = openai.OpenAI()
         self.preview_state = {}
@@ -62,8 +86,10 @@ When assigning requirements to transforms:
 - View transforms can combine data from multiple schemas
 - Dashboard transforms typically come last as they often depend on other transforms"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        response, data = router.complete(
+            self.client,
+            'blueprint.generate_initial',
+            validate=lambda r: self._parse_json_response(r, {'blueprint': list, 'response': str}),
             messages=[{
                 "role": "system",
                 "content": "You are a technical planning assistant. You must respond with valid JSON only."
@@ -77,20 +103,17 @@ When assigning requirements to transforms:
             }
         )
         
-        try:
-            import json
-            data = json.loads(response.choices[0].message.content)
-            self.blueprint = data['blueprint']
-            return {
-                'blueprint': self.blueprint,
-                'response': data['response']
-            }
-        except Exception as e:
-            print(f"Error generating blueprint: {str(e)}")
+        if data is None:
             return {
                 'blueprint': [],
                 'response': "Sorry, there was an error generating the blueprint. Please try again."
             }
+        
+        self.blueprint = data['blueprint']
+        return {
+            'blueprint': self.blueprint,
+            'response': data['response']
+        }
 
     def execute_transform(self, transform_id: str, preview_state: Dict) -> Dict:
         """Execute a specific transform."""
@@ -105,12 +128,55 @@ When assigning requirements to transforms:
         # Update transform status
         transform['status'] = 'in_progress'
         
+        # Schema transforms are inferred locally from the uploaded dataset
+        if transform['transform_type'] == 'schema' and self.dataset_path:
+            result = SchemaAgent().execute_transform(
+                transform,
+                self.dataset_path,
+                self._format_transform_requirements(transform),
+                preview_state
+            )
+            if result['status'] == 'completed':
+                schema = result['previewState']['schema']
+                database = self._get_database(schema)
+                if database:
+                    counts = database.row_counts(schema)
+                    result['message'] += f" Loaded {sum(counts.values()):,} rows into the preview database."
+            return result
+        
+        # Form transforms are rendered from templates once a schema is known
+        if transform['transform_type'] == 'form':
+            schema = self._get_schema(preview_state)
+            if schema:
+                return FormAgent().execute_transform(
+                    transform,
+                    schema,
+                    self.dataset_path,
+                    self._format_transform_requirements(transform),
+                    preview_state,
+                    database=self._get_database(schema)
+                )
+        
+        # View transforms browse real instances through key indexes
+        if transform['transform_type'] == 'view' and self.dataset_path:
+            schema = self._get_schema(preview_state)
+            if schema:
+                return ViewAgent().execute_transform(transform, schema, self.dataset_path, preview_state)
+        
+        # Dashboard transforms aggregate the real dataset
+        if transform['transform_type'] == 'dashboard' and self.dataset_path:
+            schema = self._get_schema(preview_state)
+            if schema:
+                result = DashboardAgent().execute_transform(transform, schema, self.dataset_path, preview_state)
+                if result['status'] == 'completed':
+                    return result
+        
         prompt = f"""Execute the following transform:
 Title: {transform['title']}
 Description: {transform['description']}
 Transform Type: {transform['transform_type']}
 Requirements:
-{self._format_transform_requirements(transform['requirement_ids'])}
+{self._format_transform_requirements(transform)}
 
 Current preview state:
 {preview_state}
@@ -130,8 +196,10 @@ Response format:
     }}
 }}"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        response, data = router.complete(
+            self.client,
+            'blueprint.execute_transform',
+            validate=lambda r: self._parse_json_response(r, {'status': str}),
             messages=[{
                 "role": "system",
                 "content": "You are a technical implementation assistant. You must respond with valid JSON only."
@@ -145,16 +213,13 @@ Response format:
             }
         )
         
-        try:
-            import json
-            return json.loads(response.choices[0].message.content)
-        except Exception as e:
-            print(f"Error executing transform: {str(e)}")
+        if data is None:
             return {
                 'status': 'failed',
                 'message': 'Error executing transform',
                 'preview': None
             }
+        return data
 
     def process_message(self, message: str, current_blueprint: List[Dict], 
                        chat_history: List[Dict], preview_state: Dict,
@@ -168,7 +233,7 @@ Response format:
 {self._format_blueprint()}
 
 And the current requirements:
-{self._format_requirements(requirements) if requirements else "No requirements provided"}
+{self._format_requirements(self._relevant_requirements(requirements, message)) if requirements else "No requirements provided"}
 
 And the conversation history:
 {self._format_conversation_history()}
@@ -241,8 +306,10 @@ Each change must be one of:
 2. modify: Specify transform ID and fields to update
 3. remove: Specify transform ID to remove"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        response, data = router.complete(
+            self.client,
+            'blueprint.process_message',
+            validate=lambda r: self._parse_json_response(r, {'response': str}),
             messages=[{
                 "role": "system",
                 "content": "You are a technical planning assistant. You must respond with valid JSON only."
@@ -256,21 +323,59 @@ Each change must be one of:
             }
         )
         
-        try:
-            import json
-            data = json.loads(response.choices[0].message.content)
-            
-            # Return just the response and changes, let frontend handle the updates
-            return {
-                'response': data['response'],
-                'changes': data.get('changes', [])
-            }
-        except Exception as e:
-            print(f"Error processing message: {str(e)}")
+        if data is None:
             return {
                 'response': 'Sorry, there was an error processing your message.',
                 'changes': []
             }
+        
+        # Return just the response and changes, let frontend handle the updates
+        return {
+            'response': data['response'],
+            'changes': data.get('changes', [])
+        }
+
+    def _get_schema(self, preview_state: Dict) -> Optional[Dict]:
+        """The schema from an earlier schema transform, or one inferred from the dataset."""
+        if preview_state and preview_state.get('schema'):
+            return preview_state['schema']
+        if self.dataset_path and os.path.exists(self.dataset_path):
+            try:
+                return SchemaAgent().infer_dataset_schema(self.dataset_path)
+            except Exception as e:
+                print(f"Error inferring schema: {str(e)}")
+        return None
+
+    def _get_database(self, schema: Dict) -> Optional[PreviewDatabase]:
+        """The session's preview database, loaded with the schema and dataset if it is not already."""
+        if not self.session_id or not self.dataset_path or not os.path.exists(self.dataset_path):
+            return None
+        try:
+            database = PreviewDatabase.for_session(self.session_id)
+            if database.load(schema, self.dataset_path):
+                print(f"Loaded preview database for session {self.session_id}")
+            return database
+        except Exception as e:
+            print(f"Error loading preview database: {str(e)}")
+            return None
+
+    def _parse_json_response(self, response, required_fields: Dict[str, type]) -> Optional[Dict]:
+        """Parse a JSON completion, returning None if it is malformed or missing required fields."""
+        try:
+            import json
+            data = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error parsing JSON response: {str(e)}")
+            return None
+        
+        if not isinstance(data, dict):
+            print("Response is not a JSON object")
+            return None
+        for field, field_type in required_fields.items():
+            if not isinstance(data.get(field), field_type):
+                print(f"Missing or invalid field in response: {field}")
+                return None
+        return data
 
     def _format_requirements(self, requirements: List[Dict]) -> str:
         """Format requirements for prompts."""
@@ -279,14 +384,19 @@ Each change must be one of:
             for req in requirements
         ])
         
-    def _format_transform_requirements(self, requirement_ids: List[str]) -> str:
-        """Format transform requirements for prompts."""
-        requirements = []
-        for req_id in requirement_ids:
-            req = next((r for r in self.requirements if r['id'] == req_id), None)
-            if req:
-                requirements.append(f"- {req['title']} (ID: {req['id']}): {req['description']}")
-        return "\n".join(requirements)
+    def _format_transform_requirements(self, transform: Dict) -> str:
+        """Format a transform's requirements for prompts, with the few most closely related ones."""
+        requirement_ids = set(transform.get('requirement_ids', []))
+        selected = transform_requirements(transform, self.requirements, self.session_id)
+        return "\n".join(
+            f"- {req['title']} (ID: {req['id']}): {req['description']}" + ("" if req['id'] in requirement_ids else " [related]")
+            for req in selected
+        )
+
+    def _relevant_requirements(self, requirements: List[Dict], message: str) -> List[Dict]:
+        """The requirements most relevant to a chat message, plus any it mentions by ID."""
+        mentioned = [req['id'] for req in requirements if req.get('id') and req['id'] in message]
+        return RequirementIndex.for_session(self.session_id).select(requirements, message, mentioned)
         
     def _format_blueprint(self) -> str:
         """Format current blueprint for prompts."""
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+from html import escape
+from typing import Callable, List, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from agents.datasets import load_dataset, dataset_content_hash
+from agents.session_registry import SessionRegistry
+from agents.generate_schema import coerce_series
+
+NUMERIC_TYPES = ('INTEGER', 'BIGINT', 'REAL')
+TIME_BUCKETS = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One hash per row of a sheet."""
+    if not df.shape[1]:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _prefix_fingerprint(row_hashes: np.ndarray, rows: int, columns: List) -> str:
+    """Fingerprint of the first `rows` rows, covering every one of them."""
+    return hashlib.sha1(row_hashes[:rows].tobytes() + str((rows, list(columns))).encode('utf-8')).hexdigest()
+
+
+class RollupStore:
+    """Materialized metric rollups, refreshed incrementally when rows are appended.
+
+    A rollup holds per-group counts and sums, so any mean can be derived and two
+    rollups over disjoint rows can be merged. Rollups are keyed by the content hash of
+    the upload and the sheet. For an upload not seen before, a held rollup of the same
+    sheet and metric whose rows are an exact prefix of the new sheet is reused, and only
+    the appended rows are aggregated and merged in. Every row of that prefix is hashed to
+    prove it is unchanged, which is far cheaper than coercing and grouping it again.
+    Only the most recently used rollups are kept.
+    """
+
+    def __init__(self, max_rollups: int = None):
+        self._rollups = SessionRegistry(max_rollups or int(os.getenv('MAX_CACHED_ROLLUPS', 256)))
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str, sheet_name: str, sheet: pd.DataFrame, metric: Dict,
+            aggregate: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Return the rollup of `metric` over a raw sheet, aggregating as few rows as possible.
+
+        `aggregate` turns a slice of the raw sheet into a rollup frame.
+        """
+        metric_key = json.dumps(metric, sort_keys=True)
+        rollup = self._rollups.get((content_hash, sheet_name, metric_key), lambda key: {})
+        with self._lock:
+            if 'frame' in rollup:
+                return rollup['frame']
+
+        rows = len(sheet)
+        row_hashes = _row_hashes(sheet)
+        base = self._prefix_rollup(sheet_name, metric_key, row_hashes, sheet.columns)
+        if base:
+            appended = sheet.iloc[base['rows']:]
+            frame = base['frame']
+            if len(appended):
+                print(f"Refreshing rollup {metric.get('id')} with {len(appended)} appended rows")
+                frame = self._merge(frame, aggregate(appended))
+        else:
+            frame = aggregate(sheet)
+
+        with self._lock:
+            rollup.update(rows=rows, fingerprint=_prefix_fingerprint(row_hashes, rows, sheet.columns), frame=frame)
+        return frame
+
+    def _prefix_rollup(self, sheet_name: str, metric_key: str, row_hashes: np.ndarray,
+                       columns: List) -> Optional[Dict]:
+        """The held rollup of this sheet and metric covering the longest prefix of its rows."""
+        best = None
+        for (_, held_sheet, held_metric), rollup in self._rollups.items():
+            with self._lock:
+                rollup = dict(rollup)
+            if (held_sheet != sheet_name or held_metric != metric_key or 'frame' not in rollup
+                    or rollup['rows'] > len(row_hashes) or (best and best['rows'] >= rollup['rows'])):
+                continue
+            if rollup['fingerprint'] == _prefix_fingerprint(row_hashes, rollup['rows'], columns):
+                best = rollup
+        return best
+
+    @staticmethod
+    def _merge(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        merged = pd.concat([old, new])
+        return merged.groupby(level=list(range(merged.index.nlevels)), sort=True, dropna=False).sum()
+
+
+rollup_store = RollupStore()
+
+
+class DashboardAgent:
+    """Computes dashboard metrics over the uploaded dataset and renders them.
+
+    Metrics are group-by counts, sums and means, optionally bucketed by time, computed
+    with vectorized pandas operations and kept as materialized rollups.
+    """
+
+    def __init__(self, store: RollupStore = None, max_default_metrics: int = 12, max_groups: int = 12):
+        self.store = store or rollup_store
+        self.max_default_metrics = max_default_metrics
+        self.max_groups = max_groups
+
+    def default_metrics(self, schema: Dict) -> List[Dict]:
+        """Counts per table and per enum, sums of measures, and monthly series over dates."""
+        metrics = []
+        for table in schema['tables']:
+            keys = {table['primary_key']} | {fk['column'] for fk in table.get('foreign_keys', [])}
+            metrics.append({'id': f"{table['name']}_count", 'type': 'count', 'table': table['name']})
+            dates = [c for c in table['columns'] if c['sql_type'] in ('DATE', 'TIMESTAMP')]
+            if dates:
+                metrics.append({'id': f"{table['name']}_by_{dates[0]['name']}", 'type': 'count',
+                                'table': table['name'], 'time_column': dates[0]['name'], 'bucket': 'month'})
+            for column in table['columns']:
+                if column['name'] in keys or column.get('surrogate'):
+                    continue
+                if column.get('enum'):
+                    metrics.append({'id': f"{table['name']}_by_{column['name']}", 'type': 'count',
+                                    'table': table['name'], 'group_by': column['name']})
+                elif column['sql_type'] in NUMERIC_TYPES or column['sql_type'].startswith('DECIMAL'):
+                    metrics.append({'id': f"{table['name']}_{column['name']}_sum", 'type': 'sum',
+                                    'table': table['name'], 'column': column['name']})
+        return metrics[:self.max_default_metrics]
+
+    def compute(self, schema: Dict, dataset_path: str, metrics: List[Dict]) -> List[Dict]:
+        """Return each metric's result, served from rollups where possible."""
+        dfs = load_dataset(dataset_path)
+        content_hash = dataset_content_hash(dataset_path)
+        tables = {t['name']: t for t in schema['tables']}
+        results = []
+        for metric in metrics:
+            table = tables.get(metric.get('table'))
+            if not table or table['source_sheet'] not in dfs:
+                print(f"Skipping metric {metric.get('id')}: unknown table {metric.get('table')}")
+                continue
+            try:
+                rollup = self.store.get(
+                    content_hash, table['source_sheet'], dfs[table['source_sheet']], metric,
+                    lambda rows, t=table, m=metric: self._aggregate(self._metric_frame(rows, t, m), m)
+                )
+            except Exception as e:
+                print(f"Error computing metric {metric.get('id')}: {str(e)}")
+                continue
+            results.append(self._result(metric, rollup))
+        return results
+
+    def _metric_frame(self, sheet: pd.DataFrame, table: Dict, metric: Dict) -> pd.DataFrame:
+        """The typed columns a metric needs, renamed to schema names."""
+        columns = {c['name']: c for c in table['columns']}
+        needed = [metric.get(k) for k in ('column', 'group_by', 'time_column') if metric.get(k)]
+        frame = {}
+        for name in needed:
+            column = columns[name]
+            frame[name] = coerce_series(sheet[column['source_column']], column)
+        return pd.DataFrame(frame, index=sheet.index) if frame else pd.DataFrame(index=sheet.index)
+
+    def _aggregate(self, df: pd.DataFrame, metric: Dict) -> pd.DataFrame:
+        """Aggregate rows into per-group count and sum columns."""
+        keys = []
+        if metric.get('time_column'):
+            bucket = TIME_BUCKETS.get(metric.get('bucket', 'month'), 'M')
+            keys.append(df[metric['time_column']].dt.to_period(bucket).astype(str).rename(metric['time_column']))
+        if metric.get('group_by'):
+            keys.append(df[metric['group_by']].astype('string').rename(metric['group_by']))
+
+        if metric.get('column'):
+            values = pd.to_numeric(df[metric['column']], errors='coerce')
+        else:
+            values = pd.Series(1, index=df.index)
+
+        if not keys:
+            return pd.DataFrame({'count': [values.count()], 'sum': [values.sum()]}, index=pd.Index(['all'], name='group'))
+        grouped = values.groupby(keys, dropna=False, sort=True)
+        return pd.DataFrame({'count': grouped.count(), 'sum': grouped.sum()})
+
+    def _result(self, metric: Dict, rollup: pd.DataFrame) -> Dict:
+        if metric['type'] == 'sum':
+            values = rollup['sum']
+        elif metric['type'] == 'mean':
+            values = rollup['sum'] / rollup['count'].replace(0, np.nan)
+        else:
+            values = rollup['count']
+
+        if metric.get('group_by') and not metric.get('time_column'):
+            values = values.sort_values(ascending=False).head(self.max_groups)
+        labels = [' / '.join(str(v) for v in k) if isinstance(k, tuple) else str(k) for k in values.index]
+        return {
+            'id': metric.get('id'),
+            'type': metric['type'],
+            'title': metric.get('title') or self._title(metric),
+            'kind': 'series' if metric.get('time_column') else ('breakdown' if metric.get('group_by') else 'value'),
+            'labels': labels,
+            'values': [None if pd.isna(v) else float(v) for v in values.to_numpy()],
+        }
+
+    @staticmethod
+    def _title(metric: Dict) -> str:
+        what = {'count': 'Count', 'sum': 'Total', 'mean': 'Average'}[metric['type']]
+        title = f"{what} of {metric['column']}" if metric.get('column') else f"{what} of {metric['table']}"
+        if metric.get('group_by'):
+            title += f" by {metric['group_by']}"
+        if metric.get('time_column'):
+            title += f" per {metric.get('bucket', 'month')}"
+        return title.replace('_', ' ')
+
+    def render(self, results: List[Dict]) -> str:
+        """Render metric results as KPI cards, bar breakdowns and line series."""
+        cards = []
+        charts = []
+        for result in results:
+            if result['kind'] == 'value':
+                cards.append(
+                    '<div style="border: 1px solid #ddd; border-radius: 6px; padding: 12px; min-width: 140px;">'
+                    f'<div style="color: #666; font-size: 12px;">{escape(result["title"])}</div>'
+                    f'<div style="font-size: 24px; font-weight: 600;">{self._format_number(result["values"][0])}</div></div>'
+                )
+            elif result['kind'] == 'breakdown':
+                charts.append(self._render_bars(result))
+            else:
+                charts.append(self._render_series(result))
+        return (
+            '<div class="dashboard-preview" style="font-family: system-ui, sans-serif;">'
+            f'<div style="display: flex; flex-wrap: wrap; gap: 12px; margin-bottom: 16px;">{"".join(cards)}</div>'
+            f'<div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(320px, 1fr)); gap: 16px;">{"".join(charts)}</div>'
+            '</div>'
+        )
+
+    def _render_bars(self, result: Dict) -> str:
+        peak = max([v for v in result['values'] if v is not None] or [0]) or 1
+        rows = "".join(
+            '<div style="display: flex; align-items: center; gap: 8px; margin: 2px 0;">'
+            f'<span style="width: 35%; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;">{escape(label)}</span>'
+            f'<span style="background: #2563eb; height: 12px; width: {max(0.0, (value or 0) / peak) * 50:.1f}%;"></span>'
+            f'<span>{self._format_number(value)}</span></div>'
+            for label, value in zip(result['labels'], result['values'])
+        )
+        return f'<div><h4>{escape(result["title"])}</h4>{rows}</div>'
+
+    def _render_series(self, result: Dict) -> str:
+        points = [(label, value) for label, value in zip(result['labels'], result['values'])
+                  if value is not None and label not in ('NaT', 'nan', '<NA>')]
+        if not points:
+            return f'<div><h4>{escape(result["title"])}</h4><p>No data</p></div>'
+        width, height = 300, 100
+        peak = max(v for _, v in points) or 1
+        step = width / max(1, len(points) - 1)
+        path = " ".join(f"{i * step:.1f},{height - v / peak * height:.1f}" for i, (_, v) in enumerate(points))
+        return (
+            f'<div><h4>{escape(result["title"])}</h4>'
+            f'<svg viewBox="0 0 {width} {height}" style="width: 100%; height: 120px;" preserveAspectRatio="none">'
+            f'<polyline fill="none" stroke="#2563eb" stroke-width="2" points="{path}"/></svg>'
+            f'<div style="display: flex; justify-content: space-between; font-size: 11px; color: #666;">'
+            f'<span>{escape(points[0][0])}</span><span>{escape(points[-1][0])}</span></div></div>'
+        )
+
+    @staticmethod
+    def _format_number(value: Optional[float]) -> str:
+        if value is None:
+            return '-'
+        return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+
+    def execute_transform(self, transform: Dict, schema: Dict, dataset_path: str,
+                          preview_state: Optional[Dict] = None) -> Dict:
+        """Execute a dashboard transform over the uploaded dataset."""
+        metrics = transform.get('metrics') if isinstance(transform.get('metrics'), list) else self.default_metrics(schema)
+        results = self.compute(schema, dataset_path, metrics)
+        if not results:
+            return {
+                'status': 'failed',
+                'message': 'No dashboard metrics could be computed from the dataset',
+                'preview': None
+            }
+        return {
+            'status': 'completed',
+            'message': f"Computed {len(results)} dashboard metric(s) from the dataset.",
+            'preview': self.render(results),
+            'previewState': dict(preview_state or {}, dashboard=[r['id'] for r in results])
+        }
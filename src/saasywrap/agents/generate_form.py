@@ -0,0 +1,380 @@
+import openai
+import json
+import os
+import re
+from functools import lru_cache
+from html import escape
+from string import Template
+from typing import List, Dict, Optional
+
+from agents.datasets import load_dataset
+from agents.generate_schema import tables_mentioned
+from agents.model_router import router
+from agents.preview_db import PreviewDatabase
+
+# Templates are compiled once at import; rendering only substitutes values
+PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+body { font-family: system-ui, sans-serif; margin: 16px; color: #222; }
+.crud { margin-bottom: 32px; }
+.crud-form { display: grid; grid-template-columns: max-content 1fr; gap: 8px 12px; max-width: 640px; }
+.crud-form label { align-self: center; font-weight: 500; }
+.crud-form input, .crud-form select, .crud-form textarea { padding: 6px; border: 1px solid #ccc; border-radius: 4px; }
+.crud-form input[type=checkbox] { justify-self: start; }
+.crud-form .actions { grid-column: 2; display: flex; gap: 8px; }
+.crud-form .required { color: #c00; }
+.crud-list { border-collapse: collapse; margin-top: 16px; width: 100%; }
+.crud-list th, .crud-list td { border-bottom: 1px solid #eee; padding: 6px; text-align: left; }
+button { padding: 6px 12px; border-radius: 4px; border: 1px solid #888; background: #fff; cursor: pointer; }
+button[type=submit] { background: #2563eb; border-color: #2563eb; color: #fff; }
+$css
+</style>
+</head>
+<body>
+$sections
+<script>
+$script
+</script>
+</body>
+</html>""")
+
+SECTION_TEMPLATE = Template("""<section class="crud" data-table="$table" data-key="$key" data-auto-key="$auto_key" data-rows="$rows">
+<h2>$title</h2>
+<form class="crud-form">
+$fields
+<div class="actions"><button type="submit">$submit_label</button><button type="reset">Cancel</button></div>
+</form>
+<table class="crud-list"><thead><tr>$headers<th></th></tr></thead><tbody></tbody></table>
+</section>""")
+
+LABEL_TEMPLATE = Template("""<label for="$id">$label$required_mark</label>""")
+INPUT_TEMPLATE = Template("""<input id="$id" name="$name" type="$type"$attributes>""")
+TEXTAREA_TEMPLATE = Template("""<textarea id="$id" name="$name" rows="3"$attributes></textarea>""")
+SELECT_TEMPLATE = Template("""<select id="$id" name="$name"$attributes>$options</select>""")
+OPTION_TEMPLATE = Template("""<option value="$value">$label</option>""")
+
+# Client-side CRUD over an in-memory list, shared by every section
+CRUD_SCRIPT = """
+document.querySelectorAll('.crud').forEach(function (section) {
+    var form = section.querySelector('form');
+    var tbody = section.querySelector('tbody');
+    var key = section.dataset.key;
+    var autoKey = section.dataset.autoKey === 'true';
+    var rows = JSON.parse(section.dataset.rows || '[]');
+    var editing = -1;
+
+    function render() {
+        tbody.innerHTML = '';
+        rows.forEach(function (row, index) {
+            var tr = document.createElement('tr');
+            Array.prototype.forEach.call(form.elements, function (el) {
+                if (!el.name) return;
+                var td = document.createElement('td');
+                td.textContent = row[el.name] === undefined ? '' : row[el.name];
+                tr.appendChild(td);
+            });
+            var actions = document.createElement('td');
+            var edit = document.createElement('button');
+            edit.type = 'button';
+            edit.textContent = 'Edit';
+            edit.onclick = function () {
+                editing = index;
+                Array.prototype.forEach.call(form.elements, function (el) {
+                    if (!el.name) return;
+                    if (el.type === 'checkbox') el.checked = row[el.name] === true;
+                    else el.value = row[el.name] === undefined ? '' : row[el.name];
+                });
+            };
+            var remove = document.createElement('button');
+            remove.type = 'button';
+            remove.textContent = 'Delete';
+            remove.onclick = function () {
+                rows.splice(index, 1);
+                editing = -1;
+                render();
+            };
+            actions.appendChild(edit);
+            actions.appendChild(remove);
+            tr.appendChild(actions);
+            tbody.appendChild(tr);
+        });
+    }
+
+    form.addEventListener('submit', function (e) {
+        e.preventDefault();
+        if (!form.reportValidity()) return;
+        var row = {};
+        Array.prototype.forEach.call(form.elements, function (el) {
+            if (!el.name) return;
+            row[el.name] = el.type === 'checkbox' ? el.checked : el.value;
+        });
+        if (autoKey && !row[key]) {
+            row[key] = rows.reduce(function (max, r) { return Math.max(max, Number(r[key]) || 0); }, 0) + 1;
+        }
+        if (editing >= 0) rows[editing] = row;
+        else rows.push(row);
+        editing = -1;
+        form.reset();
+        render();
+    });
+
+    form.addEventListener('reset', function () {
+        editing = -1;
+    });
+
+    render();
+});
+"""
+
+# Most foreign key options rendered into a select
+MAX_SELECT_OPTIONS = 500
+# Existing rows shown in each form's list when a preview database is available
+MAX_SAMPLE_ROWS = 50
+
+
+def _humanize(name: str) -> str:
+    return name.replace('_', ' ').strip().capitalize()
+
+
+class FormAgent:
+    """Renders CRUD forms for schema tables from precompiled templates.
+
+    Rendering is deterministic and memoized per schema, so previews come back in
+    milliseconds. The LLM is only used for optional copy and styling tweaks.
+    """
+
+    def __init__(self):
+        self.client = openai.OpenAI()
+
+    def render(self, schema: Dict, table_names: Optional[List[str]] = None,
+               fk_options: Optional[Dict[str, List[str]]] = None, overrides: Optional[Dict] = None,
+               rows: Optional[Dict[str, List[Dict]]] = None) -> str:
+        """Render a standalone HTML page with a CRUD form for each selected table.
+
+        `fk_options` maps "table.column" to the values offered by a foreign key select.
+        `rows` maps table names to existing records listed under their form.
+        `overrides` may hold "titles", "labels", "submit_label" and "css" tweaks.
+        """
+        tables = [t for t in schema['tables'] if not table_names or t['name'] in table_names]
+        key = json.dumps({
+            'tables': tables,
+            'fk_options': fk_options or {},
+            'overrides': overrides or {},
+            'rows': rows or {},
+        }, sort_keys=True, default=str)
+        return _render_page(key)
+
+    def foreign_key_options(self, schema: Dict, dataset_path: Optional[str],
+                            database: Optional[PreviewDatabase] = None) -> Dict[str, List[str]]:
+        """Distinct referenced key values for each foreign key, from the preview database or dataset."""
+        if database:
+            return {
+                f"{table['name']}.{fk['column']}": [
+                    str(row['value']) for row in database.query(
+                        f'SELECT DISTINCT "{fk["references_column"]}" AS value FROM "{fk["references_table"]}" '
+                        f'WHERE "{fk["references_column"]}" IS NOT NULL LIMIT ?', (MAX_SELECT_OPTIONS,))
+                ]
+                for table in schema['tables'] for fk in table.get('foreign_keys', [])
+            }
+        if not dataset_path or not os.path.exists(dataset_path):
+            return {}
+        dfs = load_dataset(dataset_path)
+        tables = {t['name']: t for t in schema['tables']}
+        options = {}
+        for table in schema['tables']:
+            for fk in table.get('foreign_keys', []):
+                referenced = tables.get(fk['references_table'])
+                column = next((c for c in referenced['columns'] if c['name'] == fk['references_column']), None) if referenced else None
+                df = dfs.get(referenced['source_sheet']) if referenced else None
+                if column is None or df is None or column.get('source_column') not in df:
+                    continue
+                values = df[column['source_column']].dropna().drop_duplicates().head(MAX_SELECT_OPTIONS)
+                options[f"{table['name']}.{fk['column']}"] = [str(v) for v in values]
+        return options
+
+    def sample_rows(self, schema: Dict, table_names: List[str], database: PreviewDatabase) -> Dict[str, List[Dict]]:
+        """The first records of each table, as the form list should show them."""
+        rows = {}
+        for table in schema['tables']:
+            if table['name'] not in table_names:
+                continue
+            booleans = [c['name'] for c in table['columns'] if c['sql_type'] == 'BOOLEAN']
+            records = database.query(f'SELECT * FROM "{table["name"]}" LIMIT ?', (MAX_SAMPLE_ROWS,))
+            for record in records:
+                for name in booleans:
+                    if record.get(name) is not None:
+                        record[name] = bool(record[name])
+            rows[table['name']] = records
+        return rows
+
+    def polish(self, schema: Dict, table_names: List[str], transform: Dict, requirements_text: str) -> Dict:
+        """Ask the LLM for copy and styling tweaks. Returns {} if it gives nothing usable."""
+        fields = "\n".join(
+            f"- {t['name']}: {', '.join(c['name'] for c in t['columns'])}"
+            for t in schema['tables'] if t['name'] in table_names
+        )
+        prompt = f"""CRUD forms are being generated for these tables and fields:
+{fields}
+
+Transform: {transform.get('title', '')}: {transform.get('description', '')}
+
+Requirements:
+{requirements_text or "No requirements provided"}
+
+Suggest user-facing copy and light styling. Respond with a JSON object in this format:
+{{
+    "titles": {{"table_name": "Form title"}},
+    "labels": {{"table_name.field_name": "Field label"}},
+    "submit_label": "Save",
+    "css": "extra CSS rules (optional)"
+}}"""
+
+        response, data = router.complete(
+            self.client,
+            'form.polish',
+            validate=self._parse_overrides,
+            messages=[{
+                "role": "system",
+                "content": "You are a UI copywriting assistant. You must respond with valid JSON only."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }],
+            response_format={
+                "type": "json_object"
+            }
+        )
+        return data or {}
+
+    def _parse_overrides(self, response) -> Optional[Dict]:
+        try:
+            data = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error parsing form overrides: {str(e)}")
+            return None
+        if not isinstance(data, dict):
+            return None
+        overrides = {}
+        for field in ('titles', 'labels'):
+            if isinstance(data.get(field), dict):
+                overrides[field] = {str(k): str(v) for k, v in data[field].items()}
+        if isinstance(data.get('submit_label'), str):
+            overrides['submit_label'] = data['submit_label']
+        if isinstance(data.get('css'), str):
+            # Keep the CSS from closing the style element
+            overrides['css'] = data['css'].replace('<', '')
+        return overrides
+
+    def execute_transform(self, transform: Dict, schema: Dict, dataset_path: Optional[str] = None,
+                          requirements_text: str = '', preview_state: Optional[Dict] = None,
+                          polish: bool = None, database: Optional[PreviewDatabase] = None) -> Dict:
+        """Execute a form transform for a schema produced by an earlier transform.
+
+        With a preview database, foreign key options and the listed records come from it.
+        """
+        if polish is None:
+            polish = os.getenv('FORM_LLM_POLISH', '0') == '1'
+        table_names = tables_mentioned(schema, transform) or [t['name'] for t in schema['tables']]
+        overrides = self.polish(schema, table_names, transform, requirements_text) if polish else None
+        page = self.render(schema, table_names, self.foreign_key_options(schema, dataset_path, database), overrides,
+                           self.sample_rows(schema, table_names, database) if database else None)
+
+        return {
+            'status': 'completed',
+            'message': f"Generated CRUD forms for {', '.join(table_names)}.",
+            'preview': f'<iframe class="form-preview" style="width: 100%; height: 100%; border: 0;" srcdoc="{escape(page)}"></iframe>',
+            'previewState': dict(preview_state or {}, forms=table_names)
+        }
+
+
+@lru_cache(maxsize=64)
+def _render_page(key: str) -> str:
+    """Render a page from its JSON-encoded inputs. Identical inputs hit the cache."""
+    data = json.loads(key)
+    overrides = data['overrides']
+    sections = [_render_section(table, data['fk_options'], overrides, data['rows'].get(table['name'], []))
+                for table in data['tables']]
+    return PAGE_TEMPLATE.substitute(
+        css=overrides.get('css', ''),
+        sections="\n".join(sections),
+        script=CRUD_SCRIPT
+    )
+
+
+def _render_section(table: Dict, fk_options: Dict[str, List[str]], overrides: Dict, rows: List[Dict]) -> str:
+    foreign_keys = {fk['column']: fk for fk in table.get('foreign_keys', [])}
+    labels = overrides.get('labels', {})
+    fields = []
+    headers = []
+    for column in table['columns']:
+        name = column['name']
+        label = labels.get(f"{table['name']}.{name}") or _humanize(name)
+        field_id = f"{table['name']}-{name}"
+        headers.append(f"<th>{escape(label)}</th>")
+        fields.append(LABEL_TEMPLATE.substitute(
+            id=escape(field_id),
+            label=escape(label),
+            required_mark='' if column['nullable'] or column.get('surrogate') else ' <span class="required">*</span>'
+        ))
+        fields.append(_render_widget(table, column, field_id, foreign_keys.get(name), fk_options))
+
+    primary_key = next(c for c in table['columns'] if c['name'] == table['primary_key'])
+    return SECTION_TEMPLATE.substitute(
+        table=escape(table['name']),
+        key=escape(table['primary_key']),
+        auto_key='true' if primary_key.get('surrogate') else 'false',
+        title=escape(overrides.get('titles', {}).get(table['name']) or _humanize(table['name'])),
+        fields="\n".join(fields),
+        submit_label=escape(overrides.get('submit_label') or 'Save'),
+        headers="".join(headers),
+        rows=escape(json.dumps(rows, default=str))
+    )
+
+
+def _render_widget(table: Dict, column: Dict, field_id: str, fk: Optional[Dict], fk_options: Dict[str, List[str]]) -> str:
+    """Map a column's type and constraints to an HTML widget."""
+    name = column['name']
+    sql_type = column['sql_type']
+    required = not column['nullable'] and sql_type != 'BOOLEAN'
+    attributes = ' required' if required else ''
+
+    if column.get('surrogate'):
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='number',
+                                         attributes=' readonly placeholder="auto"')
+
+    if fk or column.get('enum'):
+        values = fk_options.get(f"{table['name']}.{name}", []) if fk else column['enum']
+        options = [] if required else [OPTION_TEMPLATE.substitute(value='', label='')]
+        options += [OPTION_TEMPLATE.substitute(value=escape(v), label=escape(v)) for v in values]
+        return SELECT_TEMPLATE.substitute(id=escape(field_id), name=escape(name),
+                                          attributes=attributes, options="".join(options))
+
+    if sql_type == 'BOOLEAN':
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='checkbox', attributes='')
+    if sql_type in ('INTEGER', 'BIGINT'):
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='number',
+                                         attributes=attributes + ' step="1"')
+    if sql_type.startswith('DECIMAL'):
+        scale = re.search(r',\s*(\d+)\)', sql_type)
+        step = f"{10 ** -int(scale.group(1)):g}" if scale else 'any'
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='number',
+                                         attributes=attributes + f' step="{step}"')
+    if sql_type == 'REAL':
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='number',
+                                         attributes=attributes + ' step="any"')
+    if sql_type == 'DATE':
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='date', attributes=attributes)
+    if sql_type == 'TIMESTAMP':
+        return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='datetime-local',
+                                         attributes=attributes)
+    if sql_type == 'TEXT':
+        return TEXTAREA_TEMPLATE.substitute(id=escape(field_id), name=escape(name), attributes=attributes)
+
+    length = re.search(r'\((\d+)\)', sql_type)
+    if length:
+        attributes += f' maxlength="{length.group(1)}"'
+    return INPUT_TEMPLATE.substitute(id=escape(field_id), name=escape(name), type='text', attributes=attributes)
@@ -1,15 +1,22 @@
 import openai
-import pandas as pd
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import os
+from agents.model_router import router
+from agents.change_log import ChangeLog
+from agents.dataset_encoder import DatasetEncoder
+from agents.datasets import load_dataset
+from agents.requirement_index import RequirementIndex
 
 class RequirementsAgent:
     def __init__(self):
         self.requirements = []
         self.conversation_history = []
         self.dataset_info = None
+        self.dataset_encoder = DatasetEncoder()
         self.client = openai.OpenAI()
         self.initial_response = None
+        self.change_log: Optional[ChangeLog] = None
+        self.requirement_index = RequirementIndex()
         
     def parse_dataset(self, dataset_path: str) -> None:
         """Parse a dataset file and update the dataset_info attribute."""
@@ -17,24 +24,11 @@ class RequirementsAgent:
             self.dataset_info = None
             return
             
-        # if csv, read single df
-        if dataset_path.endswith('.csv'):
-            dfs = {"data": pd.read_csv(dataset_path)}
-        # if excel, read all sheets
-        elif dataset_path.endswith('.xlsx') or dataset_path.endswith('.xls'):
-            dfs = {}
-            for sheet_name in pd.ExcelFile(dataset_path).sheet_names:
-                dfs[sheet_name] = pd.read_excel(dataset_path, sheet_name=sheet_name)
-        else:
-            raise ValueError("Unsupported file type. Please provide a CSV or Excel file.")
+        dfs = load_dataset(dataset_path)
         
         self.dataset_info = {}
         for sheet_name, df in dfs.items():
-            self.dataset_info[sheet_name] = {
-                'columns': list(df.columns),
-                'sample_rows': df.head(5).to_dict('records'),
-                'total_rows': len(df)
-            }
+            self.dataset_info[sheet_name] = self.dataset_encoder.describe(df)
             
     def get_initial_response(self) -> str:
         """Return the stored initial response."""
@@ -93,9 +87,11 @@ Guidelines for each requirement:
 IMPORTANT: Your response must be a valid JSON object with both 'response' and 'requirements' fields.
 Each requirement must be independent and focused on a single feature or constraint."""
 
-        # Call OpenAI to generate requirements
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        # Call OpenAI to generate requirements, escalating if no choice is valid
+        response, result = router.complete(
+            self.client,
+            'requirements.generate_initial',
+            validate=self._parse_initial_requirements,
             messages=[{
                 "role": "system",
                 "content": "You are a requirements analysis assistant helping users structure their application requirements. You must respond with valid JSON only, no additional text."
@@ -110,6 +106,23 @@ Each requirement must be independent and focused on a single feature or constrai
             n=n_choices
         )
         
+        if result is None:
+            return []
+        
+        self.requirements, self.initial_response = result
+        for requirement in self.requirements:
+            self._record_change(requirement, {
+                'type': 'created',
+                'timestamp': requirement['dateAdded'],
+                'userId': 'ai-agent',
+                'details': 'Requirement generated from initial description'
+            })
+        self.requirement_index.update(self.requirements)
+        self.initial_response += self._duplicate_note(None)
+        return self.requirements
+    
+    def _parse_initial_requirements(self, response) -> Optional[Tuple[List[Dict], str]]:
+        """Return (requirements, response text) from the first valid choice, or None."""
         # Try each choice until we find a valid one
         for choice in response.choices:
             try:
@@ -147,12 +160,7 @@ Each requirement must be independent and focused on a single feature or constrai
                             'dateAdded': self._get_current_timestamp(),
                             'dateModified': self._get_current_timestamp(),
                             'createdBy': 'ai-agent',
-                            'changeHistory': [{
-                                'type': 'created',
-                                'timestamp': self._get_current_timestamp(),
-                                'userId': 'ai-agent',
-                                'details': 'Requirement generated from initial description'
-                            }]
+                            'version': 0
                         }
                         valid_requirements.append(requirement)
                     else:
@@ -161,9 +169,7 @@ Each requirement must be independent and focused on a single feature or constrai
                 
                 if all_valid and valid_requirements:
                     print(f"Found valid response in choice {choice.index}")
-                    self.requirements = valid_requirements
-                    self.initial_response = data['response']
-                    return self.requirements
+                    return valid_requirements, data['response']
                 else:
                     print(f"Invalid requirements in choice {choice.index}, trying next choice...")
                     
@@ -176,7 +182,7 @@ Each requirement must be independent and focused on a single feature or constrai
         
         # If we get here, none of the choices were valid
         print("No valid choices found")
-        return []
+        return None
             
     def _validate_requirement(self, req: Dict) -> bool:
         """Validate that a requirement has all required fields with correct values."""
@@ -222,11 +228,12 @@ Each requirement must be independent and focused on a single feature or constrai
 
     def process_message(self, message: str, n_choices: int = 3) -> str:
         """Process a chat message and update requirements if needed."""
+        relevant = self._relevant_requirements(message)
         prompt = f"""Given the following conversation about application requirements:
 {self._format_conversation_history()}
 
-And the current set of requirements:
-{self._format_requirements()}
+And the current requirements most relevant to this message ({len(relevant)} of {len(self.requirements)}):
+{self._format_requirements(relevant)}
 
 {"And the dataset information:" if self.dataset_info else ""}
 {self._format_dataset_info() if self.dataset_info else ""}
@@ -293,8 +300,10 @@ Example format:
 
 IMPORTANT: Your entire response must be a valid JSON object with these exact fields."""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        response, result = router.complete(
+            self.client,
+            'requirements.process_message',
+            validate=self._parse_chat_changes,
             messages=[{
                 "role": "system",
                 "content": "You are a requirements management assistant. You must respond with valid JSON only, no additional text."
@@ -309,6 +318,18 @@ IMPORTANT: Your entire response must be a valid JSON object with these exact fie
             n=n_choices
         )
         
+        if result is None:
+            return "I apologize, but I'm having trouble processing your request. Could you please rephrase it?"
+        
+        processed_changes, response_text = result
+        before = {req['id']: RequirementIndex._signature(req) for req in self.requirements}
+        self._apply_changes({'changes': processed_changes})
+        changed = [req['id'] for req in self.requirements if before.get(req['id']) != RequirementIndex._signature(req)]
+        self.requirement_index.update(self.requirements)
+        return response_text + self._duplicate_note(changed)
+    
+    def _parse_chat_changes(self, response) -> Optional[Tuple[List[Dict], str]]:
+        """Return (changes, response text) from the first valid choice, or None."""
         # Try each choice until we find a valid one
         for choice in response.choices:
             try:
@@ -389,8 +410,7 @@ IMPORTANT: Your entire response must be a valid JSON object with these exact fie
                 
                 # If we get here, the response is valid
                 print(f"Found valid response in choice {choice.index}")
-                self._apply_changes({'changes': processed_changes})
-                return data['response']
+                return processed_changes, data['response']
                 
             except json.JSONDecodeError as e:
                 print(f"Error parsing JSON in choice {choice.index}: {str(e)}")
@@ -401,7 +421,7 @@ IMPORTANT: Your entire response must be a valid JSON object with these exact fie
         
         # If we get here, none of the choices were valid
         print("No valid choices found")
-        return "I apologize, but I'm having trouble processing your request. Could you please rephrase it?"
+        return None
     
     def get_next_question(self) -> Optional[str]:
         """Generate the next question to ask the user, if needed."""
@@ -418,8 +438,9 @@ Determine if any clarifying questions are needed to improve or complete the requ
 If a question is needed, respond with just the question.
 If no questions are needed, respond with 'NONE'."""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+        response, _ = router.complete(
+            self.client,
+            'requirements.next_question',
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -436,17 +457,7 @@ If no questions are needed, respond with 'NONE'."""
         if not self.dataset_info:
             return ""
             
-        info = []
-        for sheet_name, sheet_data in self.dataset_info.items():
-            info.append(f"Sheet: {sheet_name}")
-            info.append(f"Columns: {', '.join(sheet_data['columns'])}")
-            info.append(f"Total rows: {sheet_data['total_rows']}")
-            info.append("Sample data:")
-            for row in sheet_data['sample_rows']:
-                info.append(str(row))
-            info.append("")  # Empty line between sheets
-            
-        return "\n".join(info).strip()
+        return self.dataset_encoder.encode(self.dataset_info)
     
     def _format_conversation_history(self) -> str:
         """Format conversation history for prompts."""
@@ -458,7 +469,23 @@ If no questions are needed, respond with 'NONE'."""
     def _format_requirements(self, requirements: Optional[List[Dict]] = None) -> str:
         """Format requirements for prompts. If no requirements provided, uses self.requirements."""
         reqs = requirements if requirements is not None else self.requirements
-        return "\n".join([f"- {req['title']}" for req in reqs])
+        return "\n".join([f"- {req['title']} (ID: {req['id']})" for req in reqs])
+
+    def _relevant_requirements(self, query: str) -> List[Dict]:
+        """The requirements most relevant to a query, plus any it mentions by ID."""
+        mentioned = [req['id'] for req in self.requirements if req.get('id') and req['id'] in query]
+        return self.requirement_index.select(self.requirements, query, mentioned)
+
+    def _duplicate_note(self, requirement_ids: Optional[List[str]]) -> str:
+        """A note naming near-duplicate requirements among (or involving) the given ones."""
+        titles = {req.get('id'): req.get('title') for req in self.requirements}
+        # The session's index is shared, so it may hold requirements another request added or removed
+        pairs = [(a, b) for a, b, _ in self.requirement_index.near_duplicates(requirement_ids)
+                 if a in titles and b in titles]
+        if not pairs:
+            return ""
+        listed = "; ".join(f'"{titles[a]}" and "{titles[b]}"' for a, b in pairs[:5])
+        return f"\n\nThese requirements look like near-duplicates and may be worth merging: {listed}."
 
     def _apply_changes(self, data: Dict) -> None:
         """Apply changes to requirements."""
@@ -475,16 +502,17 @@ If no questions are needed, respond with 'NONE'."""
                     'dateAdded': self._get_current_timestamp(),
                     'dateModified': self._get_current_timestamp(),
                     'createdBy': 'ai-agent',
-                    'changeHistory': [{
-                        'type': 'created',
-                        'timestamp': self._get_current_timestamp(),
-                        'userId': 'ai-agent',
-                        'details': 'Requirement created from chat'
-                    }]
+                    'version': 0
                 }
                 # Add parent_id if specified
                 if 'parent_id' in change['requirement']:
                     requirement['parent_id'] = change['requirement']['parent_id']
+                self._record_change(requirement, {
+                    'type': 'created',
+                    'timestamp': requirement['dateAdded'],
+                    'userId': 'ai-agent',
+                    'details': 'Requirement created from chat'
+                })
                 self.requirements.append(requirement)
                 
             elif change['type'] == 'modify':
@@ -509,11 +537,25 @@ If no questions are needed, respond with 'NONE'."""
                         # Update the requirement
                         req.update(updates)
                         req['dateModified'] = self._get_current_timestamp()
-                        if 'changeHistory' not in req:
-                            req['changeHistory'] = []
-                        req['changeHistory'].append(history_entry)
+                        self._record_change(req, history_entry)
                         break
                         
             elif change['type'] == 'remove':
                 # Remove requirement by ID
+                if self.change_log:
+                    self.change_log.append(change['id'], {
+                        'type': 'removed',
+                        'timestamp': self._get_current_timestamp(),
+                        'userId': 'ai-agent',
+                        'details': 'Requirement removed from chat'
+                    })
                 self.requirements = [req for req in self.requirements if req['id'] != change['id']]
+
+    def _record_change(self, requirement: Dict, entry: Dict) -> None:
+        """Append a change to the session's change log and bump the requirement's version."""
+        # History lives in the change log, not on the requirement
+        requirement.pop('changeHistory', None)
+        if self.change_log:
+            requirement['version'] = self.change_log.append(requirement['id'], entry)
+        else:
+            requirement['version'] = requirement.get('version', 0) + 1
@@ -0,0 +1,525 @@
+import openai
+import re
+import threading
+from html import escape
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from agents.datasets import load_dataset, dataset_fingerprint
+from agents.model_router import router
+from agents.relationships import RelationshipDetector
+
+# Formats tried, in order, when a text column looks like dates
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M',
+    '%Y/%m/%d', '%m/%d/%Y', '%d/%m/%Y', '%m/%d/%Y %H:%M', '%m/%d/%y', '%d.%m.%Y',
+    '%b %d, %Y', '%d %b %Y', '%B %d, %Y', '%d %B %Y',
+]
+BOOLEAN_VALUES = {'true', 'false', 'yes', 'no', 'y', 'n', 't', 'f'}
+VARCHAR_SIZES = [16, 32, 64, 128, 255]
+INT32_MAX = 2 ** 31 - 1
+KEY_TYPES = ('INTEGER', 'BIGINT', 'TEXT') + tuple(f'VARCHAR({size})' for size in VARCHAR_SIZES)
+# Uniqueness seen in fewer rows than this is not declared as a constraint
+MIN_ROWS_FOR_UNIQUE = 20
+
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
+
+def to_identifier(name: Any) -> str:
+    """Turn a sheet or column name into a snake_case SQL identifier."""
+    identifier = re.sub(r'[^0-9a-zA-Z]+', '_', str(name)).strip('_').lower()
+    if not identifier:
+        identifier = 'column'
+    if identifier[0].isdigit():
+        identifier = f'_{identifier}'
+    return identifier
+
+
+def tables_mentioned(schema: Dict, transform: Dict) -> List[str]:
+    """Names of the schema tables a transform's title or description refers to."""
+    text = f"{transform.get('title', '')} {transform.get('description', '')}".lower()
+    words = set(re.findall(r'[a-z0-9]+', text))
+    mentioned = []
+    for table in schema['tables']:
+        names = {table['name'], table['name'].rstrip('s'), str(table.get('source_sheet', '')).lower()}
+        if any(name and (name in words or name.replace('_', ' ') in text) for name in names):
+            mentioned.append(table['name'])
+    return mentioned
+
+
+def coerce_series(s: pd.Series, column: Dict) -> pd.Series:
+    """Convert a raw sheet column to the type inferred for it (e.g. "$1,200" -> 1200.0)."""
+    sql_type = column['sql_type']
+    is_text = not (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s)
+                   or pd.api.types.is_bool_dtype(s))
+    if not is_text:
+        return s
+    text = s.astype('string').str.strip()
+    if sql_type in ('DATE', 'TIMESTAMP'):
+        return pd.to_datetime(text, format=column.get('format'), errors='coerce')
+    if sql_type == 'BOOLEAN':
+        return text.str.lower().map(lambda v: v in ('true', 'yes', 'y', 't') if isinstance(v, str) else None)
+    if sql_type in ('INTEGER', 'BIGINT', 'REAL') or sql_type.startswith('DECIMAL'):
+        numbers = pd.to_numeric(text.str.replace(r'[\s,$€£%()]', '', regex=True), errors='coerce')
+        return numbers.where(~text.str.match(r'^\(.*\)$').fillna(False), -numbers)
+    return s
+
+
+def normalize_keys(s: pd.Series) -> np.ndarray:
+    """Values of a typed column as keys compare: uniqueness checks and key lookups both use this.
+
+    Whole numbers become exact integers (1 == 1.0, and ids above 2**53 stay distinct), other
+    numbers stay floats, and text is stripped. Missing values become None.
+    """
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+        return s.astype(object).where(s.notna(), None).to_numpy()
+    if pd.api.types.is_integer_dtype(s):
+        if not s.isna().any():
+            return s.to_numpy(dtype='int64')
+        return s.astype(object).where(s.notna(), None).to_numpy()
+    if pd.api.types.is_numeric_dtype(s):
+        values = s.to_numpy(dtype='float64')
+        present = ~np.isnan(values)
+        if not np.all(np.mod(values[present], 1) == 0) or np.any(np.abs(values[present]) >= 2.0 ** 63):
+            return s.astype(object).where(s.notna(), None).to_numpy()
+        if present.all():
+            return values.astype('int64')
+        keys = np.full(len(values), None, dtype=object)
+        keys[present] = values[present].astype('int64').tolist()
+        return keys
+    keys = s.astype(object).where(s.isna(), s.astype(str).str.strip())
+    return keys.where(keys.notna(), None).to_numpy()
+
+
+class SchemaAgent:
+    """Infers a relational schema from uploaded DataFrames.
+
+    Types, nullability, keys, enums and formats are inferred locally with vectorized
+    pandas operations; the LLM is only asked to refine table and column names and to
+    describe what they mean.
+    """
+
+    def __init__(self, enum_max_values: int = 20, sample_size: int = 1000):
+        self.client = openai.OpenAI()
+        self.enum_max_values = enum_max_values
+        self.sample_size = sample_size
+
+    def infer_dataset_schema(self, dataset_path: str) -> Dict:
+        """Infer the schema of a dataset file, cached per file version."""
+        key = dataset_fingerprint(dataset_path)
+        with _schema_cache_lock:
+            if key in _schema_cache:
+                return _schema_cache[key]
+        schema = self.infer_schema(load_dataset(dataset_path))
+        with _schema_cache_lock:
+            _schema_cache.clear()
+            _schema_cache[key] = schema
+        return schema
+
+    def infer_schema(self, dfs: Dict[str, pd.DataFrame]) -> Dict:
+        """Infer one table per sheet, plus foreign keys between sheets."""
+        tables = []
+        used_names = set()
+        for sheet_name, df in dfs.items():
+            table = self.infer_table(sheet_name, df)
+            table['name'] = self._unique_name(table['name'], used_names)
+            tables.append(table)
+        if len(tables) > 1:
+            self._add_foreign_keys(dfs, tables)
+        return {'tables': tables}
+
+    def _add_foreign_keys(self, dfs: Dict[str, pd.DataFrame], tables: List[Dict]) -> None:
+        """Attach detected cross-sheet relationships to the referencing tables."""
+        by_sheet = {t['source_sheet']: t for t in tables}
+        source_names = {
+            (t['source_sheet'], c['source_column']): c['name']
+            for t in tables for c in t['columns'] if c['source_column'] is not None
+        }
+        sources = {(t['source_sheet'], c['name']): c['source_column'] for t in tables for c in t['columns']}
+        candidate_keys = {t['source_sheet']: [sources[(t['source_sheet'], k)] for k in t['candidate_keys']]
+                          for t in tables}
+        preferred_keys = {t['source_sheet']: sources[(t['source_sheet'], t['primary_key'])] for t in tables}
+
+        for relationship in RelationshipDetector().detect(dfs, candidate_keys, preferred_keys):
+            table = by_sheet[relationship['table']]
+            referenced = by_sheet[relationship['referenced_table']]
+            table.setdefault('foreign_keys', []).append({
+                'column': source_names[(relationship['table'], relationship['column'])],
+                'references_table': referenced['name'],
+                'references_column': source_names[(relationship['referenced_table'], relationship['referenced_column'])],
+                'containment': relationship['containment'],
+            })
+
+    def infer_table(self, sheet_name: str, df: pd.DataFrame) -> Dict:
+        """Infer columns and keys for a single sheet."""
+        table_name = to_identifier(sheet_name)
+        columns = []
+        used_names = set()
+        for source_column, s in df.items():
+            column = self.infer_column(s)
+            column['name'] = self._unique_name(to_identifier(source_column), used_names)
+            column['source_column'] = source_column
+            columns.append(column)
+
+        candidate_keys = [c['name'] for c in columns
+                          if c['unique'] and not c['nullable'] and len(df) and c['sql_type'] in KEY_TYPES]
+        primary_key = self._choose_primary_key(table_name, candidate_keys)
+        if primary_key is None:
+            # No natural key: add a surrogate one
+            primary_key = self._unique_name('id', used_names)
+            columns.insert(0, {
+                'name': primary_key,
+                'source_column': None,
+                'sql_type': 'INTEGER',
+                'nullable': False,
+                'unique': True,
+                'surrogate': True,
+            })
+
+        return {
+            'name': table_name,
+            'source_sheet': sheet_name,
+            'row_count': len(df),
+            'columns': columns,
+            'primary_key': primary_key,
+            'candidate_keys': candidate_keys,
+        }
+
+    def infer_column(self, s: pd.Series) -> Dict:
+        """Infer SQL type, nullability, uniqueness, enum values and format of a column."""
+        non_null = s.dropna()
+        column = {'nullable': len(non_null) < len(s)}
+
+        if pd.api.types.is_bool_dtype(s):
+            column['sql_type'] = 'BOOLEAN'
+        elif pd.api.types.is_integer_dtype(s):
+            column['sql_type'] = self._integer_type(non_null)
+        elif pd.api.types.is_float_dtype(s):
+            values = non_null.to_numpy()
+            if len(values) and np.all(np.mod(values, 1) == 0):
+                column['sql_type'] = self._integer_type(non_null)
+            else:
+                column['sql_type'] = 'REAL'
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            column['sql_type'] = 'DATE' if (non_null == non_null.dt.normalize()).all() else 'TIMESTAMP'
+        else:
+            column.update(self._infer_text_column(non_null))
+            if column.pop('has_blank', False):
+                column['nullable'] = True
+
+        # Unique as keys compare, e.g. ' A1' and 'A1' or "1" and "1.0" are the same key
+        keys = pd.Series(normalize_keys(coerce_series(non_null, column)), dtype=object)
+        keys = keys[keys.notna()]
+        column['unique'] = bool(len(keys)) and keys.nunique() == len(keys)
+        distinct = non_null.nunique()
+        if (column['sql_type'].startswith('VARCHAR') and 0 < distinct <= self.enum_max_values
+                and distinct * 2 <= len(non_null)):
+            column['enum'] = sorted(str(v) for v in non_null.unique())
+        return column
+
+    def _infer_text_column(self, non_null: pd.Series) -> Dict:
+        """Infer the type of an object column from its distinct values."""
+        values = pd.Series(non_null.unique()).astype(str).str.strip()
+        has_blank = bool((values == '').any())
+        values = values[values != '']
+        if values.empty:
+            return {'sql_type': 'VARCHAR(16)', 'has_blank': has_blank}
+
+        lowered = values.str.lower()
+        if lowered.isin(BOOLEAN_VALUES).all() and len(lowered.unique()) <= 2:
+            return {'sql_type': 'BOOLEAN', 'format': '/'.join(sorted(lowered.unique())), 'has_blank': has_blank}
+
+        # Cheap rejection on a sample before checking every distinct value
+        sample = values.iloc[:self.sample_size]
+        number = self._infer_number_format(sample) and self._infer_number_format(values)
+        if number:
+            number['has_blank'] = has_blank
+            return number
+
+        date_format = self._infer_date_format(sample) and self._infer_date_format(values)
+        if date_format:
+            sql_type = 'TIMESTAMP' if '%H' in date_format else 'DATE'
+            return {'sql_type': sql_type, 'format': date_format, 'has_blank': has_blank}
+
+        max_length = int(values.str.len().max())
+        size = next((size for size in VARCHAR_SIZES if max_length <= size), None)
+        return {'sql_type': f'VARCHAR({size})' if size else 'TEXT', 'has_blank': has_blank}
+
+    def _infer_number_format(self, values: pd.Series) -> Optional[Dict]:
+        """Detect numbers written as text, e.g. "$1,200.50", "15%" or "(300)"."""
+        if not values.str.contains(r'\d', regex=True).all():
+            return None
+        # Leading zeros mark codes such as ZIPs ("01234"), which are text
+        if values.str.match(r'^0\d').any():
+            return None
+        negative = values.str.match(r'^\(.*\)$')
+        cleaned = values.str.replace(r'[\s,$€£%()]', '', regex=True)
+        numbers = pd.to_numeric(cleaned, errors='coerce')
+        if numbers.isna().any():
+            return None
+        numbers = numbers.where(~negative, -numbers)
+
+        formats = []
+        if values.str.contains(r'[$€£]', regex=True).any():
+            formats.append('currency')
+        if values.str.endswith('%').any():
+            formats.append('percent')
+        if values.str.contains(',', regex=False).any():
+            formats.append('thousands_separator')
+        if negative.any():
+            formats.append('parenthesized_negative')
+
+        if 'currency' in formats:
+            sql_type = 'DECIMAL(18,2)'
+        elif np.all(np.mod(numbers.to_numpy(), 1) == 0) and not values.str.contains('.', regex=False).any():
+            sql_type = self._integer_type(numbers)
+        else:
+            sql_type = 'REAL'
+        result = {'sql_type': sql_type}
+        if formats:
+            result['format'] = ','.join(formats)
+        return result
+
+    def _infer_date_format(self, values: pd.Series) -> Optional[str]:
+        """Return the first date format that parses every value."""
+        if not values.str.contains(r'\d', regex=True).all():
+            return None
+        for date_format in DATE_FORMATS:
+            if pd.to_datetime(values, format=date_format, errors='coerce').notna().all():
+                return date_format
+        return None
+
+    @staticmethod
+    def _integer_type(values: pd.Series) -> str:
+        if len(values) and max(abs(values.min()), abs(values.max())) > INT32_MAX:
+            return 'BIGINT'
+        return 'INTEGER'
+
+    @staticmethod
+    def _choose_primary_key(table_name: str, candidate_keys: List[str]) -> Optional[str]:
+        """Pick the most key-like of the candidate keys."""
+        if not candidate_keys:
+            return None
+        singular = table_name[:-1] if table_name.endswith('s') else table_name
+
+        def score(name):
+            return (
+                name == 'id',
+                name in (f'{table_name}_id', f'{singular}_id'),
+                name.endswith('_id') or name.endswith('_key') or name.endswith('_code'),
+            )
+        # max() keeps the leftmost column among equally scored ones
+        return max(candidate_keys, key=score)
+
+    @staticmethod
+    def _unique_name(name: str, used_names: set) -> str:
+        candidate, i = name, 2
+        while candidate in used_names:
+            candidate = f'{name}_{i}'
+            i += 1
+        used_names.add(candidate)
+        return candidate
+
+    def to_ddl(self, schema: Dict, quote: bool = False) -> str:
+        """Render CREATE TABLE statements for a schema, optionally with quoted identifiers."""
+        q = (lambda name: f'"{name}"') if quote else (lambda name: name)
+        referenced = {(fk['references_table'], fk['references_column'])
+                      for t in schema['tables'] for fk in t.get('foreign_keys', [])}
+        statements = []
+        for table in schema['tables']:
+            lines = []
+            for column in table['columns']:
+                line = f"    {q(column['name'])} {column['sql_type']}"
+                if not column['nullable']:
+                    line += " NOT NULL"
+                if column.get('enum'):
+                    values = ", ".join("'" + v.replace("'", "''") + "'" for v in column['enum'])
+                    line += f" CHECK ({q(column['name'])} IN ({values}))"
+                lines.append(line)
+            lines.append(f"    PRIMARY KEY ({q(table['primary_key'])})")
+            for key in table['candidate_keys']:
+                if key != table['primary_key'] and (table['row_count'] >= MIN_ROWS_FOR_UNIQUE
+                                                    or (table['name'], key) in referenced):
+                    lines.append(f"    UNIQUE ({q(key)})")
+            for fk in table.get('foreign_keys', []):
+                lines.append(f"    FOREIGN KEY ({q(fk['column'])}) REFERENCES {q(fk['references_table'])} ({q(fk['references_column'])})")
+            statements.append(f"CREATE TABLE {q(table['name'])} (\n" + ",\n".join(lines) + "\n);")
+        return "\n\n".join(statements)
+
+    def refine_schema(self, schema: Dict, description: str, requirements_text: str) -> Dict:
+        """Ask the LLM for better names and descriptions. Types and keys are left untouched."""
+        prompt = f"""The following database schema was inferred from an uploaded spreadsheet:
+{self._format_schema(schema)}
+
+It implements this transform:
+{description}
+
+Requirements:
+{requirements_text or "No requirements provided"}
+
+Suggest clearer snake_case table and column names where the inferred ones are unclear, and a short description of each table and column.
+Do not change types, keys or the set of columns.
+
+Respond with a JSON object in this format:
+{{
+    "tables": [
+        {{
+            "name": "current_table_name",
+            "new_name": "better_table_name",
+            "description": "What a row in this table represents",
+            "columns": [
+                {{
+                    "name": "current_column_name",
+                    "new_name": "better_column_name",
+                    "description": "What this column holds"
+                }}
+            ]
+        }}
+    ]
+}}"""
+
+        response, data = router.complete(
+            self.client,
+            'schema.refine',
+            validate=self._parse_refinement,
+            messages=[{
+                "role": "system",
+                "content": "You are a database design assistant. You must respond with valid JSON only."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }],
+            response_format={
+                "type": "json_object"
+            }
+        )
+
+        if data is None:
+            return schema
+        return self._apply_refinement(schema, data)
+
+    def _parse_refinement(self, response) -> Optional[Dict]:
+        try:
+            import json
+            data = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error parsing schema refinement: {str(e)}")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('tables'), list):
+            print("Schema refinement is missing tables")
+            return None
+        return data
+
+    def _apply_refinement(self, schema: Dict, refinement: Dict) -> Dict:
+        """Apply valid renames and descriptions to a copy of the schema."""
+        import copy
+        schema = copy.deepcopy(schema)
+        tables = {t['name']: t for t in schema['tables']}
+        used_tables = set(tables)
+        table_renames = {}
+        column_renames = {}
+        for refined in refinement['tables']:
+            table = tables.get(refined.get('name')) if isinstance(refined, dict) else None
+            if not table:
+                continue
+            if refined.get('description'):
+                table['description'] = str(refined['description'])
+
+            columns = {c['name']: c for c in table['columns']}
+            used_columns = set(columns)
+            renames = {}
+            for refined_column in refined.get('columns') or []:
+                column = columns.get(refined_column.get('name')) if isinstance(refined_column, dict) else None
+                if not column:
+                    continue
+                if refined_column.get('description'):
+                    column['description'] = str(refined_column['description'])
+                new_name = to_identifier(refined_column.get('new_name') or column['name'])
+                if new_name != column['name'] and new_name not in used_columns:
+                    used_columns.discard(column['name'])
+                    used_columns.add(new_name)
+                    renames[column['name']] = new_name
+                    column['name'] = new_name
+            table['primary_key'] = renames.get(table['primary_key'], table['primary_key'])
+            table['candidate_keys'] = [renames.get(k, k) for k in table['candidate_keys']]
+            column_renames[table['name']] = renames
+
+            new_name = to_identifier(refined.get('new_name') or table['name'])
+            if new_name != table['name'] and new_name not in used_tables:
+                used_tables.discard(table['name'])
+                used_tables.add(new_name)
+                table_renames[table['name']] = new_name
+
+        # Foreign keys refer to tables and columns by their old names
+        for table in schema['tables']:
+            for fk in table.get('foreign_keys', []):
+                fk['column'] = column_renames.get(table['name'], {}).get(fk['column'], fk['column'])
+                referenced_renames = column_renames.get(fk['references_table'], {})
+                fk['references_column'] = referenced_renames.get(fk['references_column'], fk['references_column'])
+                fk['references_table'] = table_renames.get(fk['references_table'], fk['references_table'])
+        for table in schema['tables']:
+            table['name'] = table_renames.get(table['name'], table['name'])
+        return schema
+
+    def _format_schema(self, schema: Dict) -> str:
+        """Format a schema for prompts."""
+        lines = []
+        for table in schema['tables']:
+            lines.append(f"Table {table['name']} (sheet '{table['source_sheet']}', {table['row_count']} rows, primary key {table['primary_key']}):")
+            for column in table['columns']:
+                details = [column['sql_type'], 'NULL' if column['nullable'] else 'NOT NULL']
+                if column.get('format'):
+                    details.append(f"format {column['format']}")
+                if column.get('enum'):
+                    details.append(f"values {', '.join(column['enum'][:10])}")
+                lines.append(f"- {column['name']}: {', '.join(details)}")
+            for fk in table.get('foreign_keys', []):
+                lines.append(f"- foreign key {fk['column']} -> {fk['references_table']}.{fk['references_column']}")
+        return "\n".join(lines)
+
+    def execute_transform(self, transform: Dict, dataset_path: str, requirements_text: str = '',
+                          preview_state: Optional[Dict] = None, refine: bool = True) -> Dict:
+        """Execute a schema transform against the uploaded dataset."""
+        try:
+            schema = self.infer_dataset_schema(dataset_path)
+        except Exception as e:
+            print(f"Error inferring schema: {str(e)}")
+            return {
+                'status': 'failed',
+                'message': 'Error inferring schema from the dataset',
+                'preview': None
+            }
+
+        if refine:
+            schema = self.refine_schema(schema, f"{transform['title']}: {transform['description']}", requirements_text)
+        ddl = self.to_ddl(schema)
+
+        return {
+            'status': 'completed',
+            'message': f"Inferred {len(schema['tables'])} table(s) from the dataset.",
+            'preview': self._render_preview(schema, ddl),
+            'previewState': dict(preview_state or {}, schema=schema, ddl=ddl)
+        }
+
+    def _render_preview(self, schema: Dict, ddl: str) -> str:
+        sections = []
+        for table in schema['tables']:
+            rows = "".join(
+                f"<tr><td>{escape(c['name'])}</td><td>{escape(c['sql_type'])}</td>"
+                f"<td>{'yes' if c['nullable'] else 'no'}</td>"
+                f"<td>{'PK' if c['name'] == table['primary_key'] else ''}</td>"
+                f"<td>{escape(c.get('format') or ', '.join(c.get('enum', [])[:5]))}</td>"
+                f"<td>{escape(c.get('description', ''))}</td></tr>"
+                for c in table['columns']
+            )
+            sections.append(
+                f"<h3>{escape(table['name'])}</h3>"
+                f"<p>{escape(table.get('description', ''))}</p>"
+                "<table><tr><th>Column</th><th>Type</th><th>Nullable</th><th>Key</th>"
+                f"<th>Format / values</th><th>Description</th></tr>{rows}</table>"
+            )
+        return f"<div class=\"schema-preview\">{''.join(sections)}<pre>{escape(ddl)}</pre></div>"
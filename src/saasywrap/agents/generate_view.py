@@ -0,0 +1,358 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from html import escape
+from string import Template
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from agents.datasets import load_dataset, dataset_fingerprint
+from agents.generate_schema import tables_mentioned, coerce_series, normalize_keys
+
+# Child rows shown per relationship; the total is always reported
+MAX_CHILD_ROWS = 20
+MAX_CACHED_INDEXES = 4
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+VIEW_PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+body { font-family: system-ui, sans-serif; margin: 16px; color: #222; }
+.view-nav { display: flex; gap: 8px; align-items: center; margin-bottom: 16px; }
+.view-nav input { padding: 6px; border: 1px solid #ccc; border-radius: 4px; }
+.instance h2 { margin-top: 0; }
+.instance table { border-collapse: collapse; margin-bottom: 16px; }
+.instance th, .instance td { border-bottom: 1px solid #eee; padding: 4px 8px; text-align: left; }
+.instance .fields th { color: #666; font-weight: 500; }
+.instance .related { margin-bottom: 16px; }
+.instance .muted { color: #666; font-size: 12px; }
+button { padding: 6px 12px; border-radius: 4px; border: 1px solid #888; background: #fff; cursor: pointer; }
+button:disabled { opacity: 0.4; cursor: default; }
+</style>
+</head>
+<body>
+<div class="view-nav">
+<button type="button" id="previous">Previous</button>
+<button type="button" id="next">Next</button>
+<span id="position" class="muted"></span>
+<form id="find"><input name="key" placeholder="Go to $key_label"> <button type="submit">Go</button></form>
+</div>
+<div id="instance">$instance</div>
+<script>
+var state = $state;
+function update(page) {
+    state.cursor = page.cursor;
+    state.next = page.next_cursor;
+    state.previous = page.previous_cursor;
+    document.getElementById('next').disabled = state.next === null;
+    document.getElementById('previous').disabled = state.previous === null;
+    document.getElementById('position').textContent = page.total ? (Number(page.cursor) + 1) + ' of ' + page.total : '';
+}
+function load(body) {
+    body.datasetPath = state.datasetPath;
+    body.schema = state.schema;
+    body.table = state.table;
+    fetch('/api/view-instances', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(body)
+    }).then(function (r) { return r.json(); }).then(function (page) {
+        if (page.error) return;
+        document.getElementById('instance').innerHTML = page.html;
+        update(page);
+    });
+}
+document.getElementById('next').onclick = function () { load({cursor: state.next}); };
+document.getElementById('previous').onclick = function () { load({cursor: state.previous}); };
+document.getElementById('find').onsubmit = function (e) {
+    e.preventDefault();
+    load({key: this.elements.key.value});
+};
+update(state.page);
+</script>
+</body>
+</html>""")
+
+
+def _normalize_key(value: Any, numeric: bool) -> Any:
+    """Normalize a single key the same way normalize_keys does for the column it is looked up in."""
+    if value is None:
+        return None
+    if numeric:
+        text = str(value).replace(',', '').strip()
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            number = float(text)
+        except ValueError:
+            return None
+        return int(number) if number.is_integer() and abs(number) < 2.0 ** 63 else number
+    return str(value).strip()
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class InstanceIndex:
+    """Hash indexes over the key columns of every table in a dataset.
+
+    Built once per dataset version and schema: each table's primary key maps to a row
+    position, and each foreign key maps a referenced key to the positions of the rows
+    that reference it. Resolving an instance with its parent and child records is then a
+    constant number of hash lookups per related table, whatever the size of the sheets.
+    """
+
+    def __init__(self, schema: Dict, dfs: Dict[str, pd.DataFrame]):
+        self.tables = {t['name']: t for t in schema['tables'] if t['source_sheet'] in dfs}
+        self.frames = {name: dfs[t['source_sheet']] for name, t in self.tables.items()}
+        self.keys = {}       # table -> (pd.Index of distinct normalized primary keys, their first row positions)
+        self.numeric = {}    # table -> whether its primary key is numeric
+        self.references = {}  # (table, fk column) -> normalized values, by row position
+        self.children = {}   # referenced table -> [(table, fk column, {key: positions})]
+
+        for name, table in self.tables.items():
+            key_column = self._column(table, table['primary_key'])
+            if key_column.get('surrogate'):
+                self.keys[name] = None
+                self.numeric[name] = True
+            else:
+                typed = coerce_series(self.frames[name][key_column['source_column']], key_column)
+                keys = pd.Index(normalize_keys(typed), dtype=object)
+                # A key repeated in the sheet resolves to its first row
+                first = ~keys.duplicated()
+                self.keys[name] = (keys[first], np.flatnonzero(first))
+                self.numeric[name] = pd.api.types.is_numeric_dtype(typed) and not pd.api.types.is_bool_dtype(typed)
+
+        for name, table in self.tables.items():
+            for fk in table.get('foreign_keys', []):
+                if fk['references_table'] not in self.tables:
+                    continue
+                column = self._column(table, fk['column'])
+                values = normalize_keys(coerce_series(self.frames[name][column['source_column']], column))
+                self.references[(name, fk['column'])] = values
+                groups = pd.Series(np.arange(len(values))).groupby(values, sort=False).indices
+                self.children.setdefault(fk['references_table'], []).append((name, fk['column'], groups))
+
+    @staticmethod
+    def _column(table: Dict, name: str) -> Dict:
+        return next(c for c in table['columns'] if c['name'] == name)
+
+    def row_count(self, table: str) -> int:
+        return len(self.frames[table])
+
+    def position(self, table: str, key: Any) -> Optional[int]:
+        """Row position of the instance with primary key `key`, or None."""
+        key = _normalize_key(key, self.numeric[table])
+        if key is None:
+            return None
+        if self.keys[table] is None:
+            position = int(key) - 1 if float(key).is_integer() else -1
+        else:
+            keys, positions = self.keys[table]
+            found = keys.get_indexer([key])[0]
+            position = positions[found] if found >= 0 else -1
+        return int(position) if 0 <= position < self.row_count(table) else None
+
+    def records(self, table: str, positions: np.ndarray) -> List[Dict]:
+        """Typed records for the rows at `positions`, keyed by schema column names."""
+        positions = np.asarray(positions, dtype=int)
+        rows = self.frames[table].iloc[positions]
+        columns = {}
+        for column in self.tables[table]['columns']:
+            if column.get('surrogate'):
+                columns[column['name']] = positions + 1
+            else:
+                values = coerce_series(rows[column['source_column']], column)
+                if pd.api.types.is_datetime64_any_dtype(values):
+                    values = values.dt.strftime('%Y-%m-%d' if column['sql_type'] == 'DATE' else '%Y-%m-%d %H:%M:%S')
+                columns[column['name']] = values.to_numpy()
+        return [{name: _json_value(values[i]) for name, values in columns.items()} for i in range(len(positions))]
+
+    def instance(self, table: str, position: int) -> Dict:
+        """One instance with the records it references and the records referencing it."""
+        record = self.records(table, [position])[0]
+        key = record[self.tables[table]['primary_key']]
+
+        parents = []
+        for fk in self.tables[table].get('foreign_keys', []):
+            values = self.references.get((table, fk['column']))
+            if values is None or pd.isna(values[position]):
+                continue
+            parent = self.position(fk['references_table'], values[position])
+            parents.append({
+                'column': fk['column'],
+                'table': fk['references_table'],
+                'record': self.records(fk['references_table'], [parent])[0] if parent is not None else None,
+            })
+
+        children = []
+        lookup = _normalize_key(key, self.numeric[table])
+        for child_table, column, groups in self.children.get(table, []):
+            positions = groups.get(lookup, np.array([], dtype=int))
+            children.append({
+                'table': child_table,
+                'column': column,
+                'total': len(positions),
+                'records': self.records(child_table, np.sort(positions)[:MAX_CHILD_ROWS]),
+            })
+
+        return {'table': table, 'key': key, 'record': record, 'parents': parents, 'children': children}
+
+    def page(self, table: str, cursor: Optional[str] = None, limit: int = 1) -> Dict:
+        """Instances starting at `cursor`, an opaque position returned by a previous page."""
+        total = self.row_count(table)
+        try:
+            start = min(max(int(cursor or 0), 0), max(total - 1, 0))
+        except ValueError:
+            start = 0
+        end = min(start + max(limit, 1), total)
+        return {
+            'instances': [self.instance(table, position) for position in range(start, end)],
+            'cursor': str(start),
+            'next_cursor': str(end) if end < total else None,
+            'previous_cursor': str(max(start - limit, 0)) if start > 0 else None,
+            'total': total,
+        }
+
+
+class ViewAgent:
+    """Builds detailed views of single instances that span several tables.
+
+    Views read the uploaded dataset through an InstanceIndex, so browsing to the next
+    instance or jumping to a key never scans a sheet.
+    """
+
+    def index_for(self, schema: Dict, dataset_path: str) -> InstanceIndex:
+        """The instance index for a dataset version and schema, built on first use."""
+        key = (dataset_fingerprint(dataset_path),
+               hashlib.sha1(json.dumps(schema, sort_keys=True, default=str).encode('utf-8')).hexdigest())
+        with _index_cache_lock:
+            if key in _index_cache:
+                _index_cache.move_to_end(key)
+                return _index_cache[key]
+
+        index = InstanceIndex(schema, load_dataset(dataset_path))
+
+        with _index_cache_lock:
+            _index_cache[key] = index
+            while len(_index_cache) > MAX_CACHED_INDEXES:
+                _index_cache.popitem(last=False)
+        return index
+
+    def select_table(self, schema: Dict, transform: Dict) -> str:
+        """The table a view is rooted at: the first one mentioned, else the most connected one."""
+        mentioned = tables_mentioned(schema, transform)
+        if mentioned:
+            return mentioned[0]
+
+        def connections(table):
+            referenced = sum(fk['references_table'] == table['name']
+                             for t in schema['tables'] for fk in t.get('foreign_keys', []))
+            return len(table.get('foreign_keys', [])) + referenced
+
+        return max(schema['tables'], key=connections)['name']
+
+    def browse(self, schema: Dict, dataset_path: str, table: str, cursor: Optional[str] = None,
+               key: Any = None) -> Dict:
+        """A page holding the instance at `cursor`, or the one with primary key `key`."""
+        index = self.index_for(schema, dataset_path)
+        if table not in index.tables:
+            raise ValueError(f"Unknown table: {table}")
+        if key not in (None, ''):
+            position = index.position(table, key)
+            if position is None:
+                raise ValueError(f"No {table} with key {key}")
+            cursor = str(position)
+        page = index.page(table, cursor)
+        page['html'] = self.render_instance(index, page['instances'][0]) if page['instances'] else '<p>No records</p>'
+        return page
+
+    def render_instance(self, index: InstanceIndex, instance: Dict) -> str:
+        """Render an instance as a field list with its parent and child records."""
+        parts = [
+            f'<div class="instance"><h2>{escape(self._humanize(instance["table"]))} {escape(str(instance["key"]))}</h2>',
+            self._render_fields(instance['record']),
+        ]
+        for parent in instance['parents']:
+            parts.append(f'<div class="related"><h3>{escape(self._humanize(parent["table"]))} '
+                         f'<span class="muted">via {escape(parent["column"])}</span></h3>')
+            parts.append(self._render_fields(parent['record']) if parent['record'] else
+                         '<p class="muted">Referenced record not found</p>')
+            parts.append('</div>')
+        for child in instance['children']:
+            shown = len(child['records'])
+            parts.append(f'<div class="related"><h3>{escape(self._humanize(child["table"]))} '
+                         f'<span class="muted">{shown} of {child["total"]} by {escape(child["column"])}</span></h3>')
+            parts.append(self._render_rows([c['name'] for c in index.tables[child['table']]['columns']],
+                                           child['records']))
+            parts.append('</div>')
+        parts.append('</div>')
+        return "".join(parts)
+
+    def _render_fields(self, record: Dict) -> str:
+        rows = "".join(f'<tr><th>{escape(self._humanize(name))}</th><td>{escape(self._format(value))}</td></tr>'
+                       for name, value in record.items())
+        return f'<table class="fields">{rows}</table>'
+
+    def _render_rows(self, columns: List[str], records: List[Dict]) -> str:
+        if not records:
+            return '<p class="muted">None</p>'
+        headers = "".join(f'<th>{escape(self._humanize(c))}</th>' for c in columns)
+        rows = "".join('<tr>' + "".join(f'<td>{escape(self._format(r.get(c)))}</td>' for c in columns) + '</tr>'
+                       for r in records)
+        return f'<table><thead><tr>{headers}</tr></thead><tbody>{rows}</tbody></table>'
+
+    @staticmethod
+    def _humanize(name: str) -> str:
+        return name.replace('_', ' ').strip().capitalize()
+
+    @staticmethod
+    def _format(value: Any) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def execute_transform(self, transform: Dict, schema: Dict, dataset_path: str,
+                          preview_state: Optional[Dict] = None) -> Dict:
+        """Execute a view transform over the uploaded dataset."""
+        table = self.select_table(schema, transform)
+        page = self.browse(schema, dataset_path, table)
+        primary_key = self.index_for(schema, dataset_path).tables[table]['primary_key']
+        state = {
+            'datasetPath': dataset_path,
+            'schema': schema,
+            'table': table,
+            'page': {k: page[k] for k in ('cursor', 'next_cursor', 'previous_cursor', 'total')},
+        }
+        html = VIEW_PAGE_TEMPLATE.substitute(
+            key_label=escape(self._humanize(primary_key)),
+            instance=page['html'],
+            # Keep the JSON from closing the script element
+            state=json.dumps(state, default=str).replace('</', '<\\/')
+        )
+
+        related = sorted({p['table'] for i in page['instances'] for p in i['parents']} |
+                         {c['table'] for i in page['instances'] for c in i['children']})
+        return {
+            'status': 'completed',
+            'message': f"Generated an instance view of {table}" +
+                       (f" with related {', '.join(related)}." if related else "."),
+            'preview': f'<iframe class="view-preview" style="width: 100%; height: 100%; border: 0;" srcdoc="{escape(html)}"></iframe>',
+            'previewState': dict(preview_state or {}, views=[table])
+        }
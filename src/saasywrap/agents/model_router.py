@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Model used for each tier. Override with MODEL_TIER_<NAME>, e.g. MODEL_TIER_STRONG=gpt-4o
+DEFAULT_TIERS = {
+    'fast': 'gpt-4o-mini',
+    'standard': 'gpt-4o-mini',
+    'strong': 'gpt-4o',
+}
+
+# Tiers are tried in this order when a response fails validation
+ESCALATION_ORDER = ['fast', 'standard', 'strong']
+
+# Starting tier for each agent operation. Override with MODEL_ROUTES='{"operation": "tier"}'
+DEFAULT_ROUTES = {
+    'requirements.generate_initial': 'standard',
+    'requirements.process_message': 'standard',
+    'requirements.next_question': 'fast',
+    'blueprint.generate_initial': 'standard',
+    'blueprint.execute_transform': 'standard',
+    'blueprint.process_message': 'standard',
+    'schema.refine': 'fast',
+    'form.polish': 'fast',
+}
+
+
+class ModelRouter:
+    """Routes agent operations to model tiers, with escalation, hedging and latency stats."""
+
+    def __init__(self, routes: Optional[Dict[str, str]] = None, tiers: Optional[Dict[str, str]] = None,
+                 hedge_percentile: float = None, hedge_min_samples: int = None,
+                 max_escalations: int = None, window: int = 200):
+        self.tiers = dict(DEFAULT_TIERS)
+        for tier in self.tiers:
+            self.tiers[tier] = os.getenv(f'MODEL_TIER_{tier.upper()}', self.tiers[tier])
+        if tiers:
+            self.tiers.update(tiers)
+
+        self.routes = dict(DEFAULT_ROUTES)
+        if os.getenv('MODEL_ROUTES'):
+            self.routes.update(json.loads(os.getenv('MODEL_ROUTES')))
+        if routes:
+            self.routes.update(routes)
+
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else float(os.getenv('MODEL_HEDGE_PERCENTILE', 95))
+        self.hedge_min_samples = hedge_min_samples if hedge_min_samples is not None else int(os.getenv('MODEL_HEDGE_MIN_SAMPLES', 20))
+        self.max_escalations = max_escalations if max_escalations is not None else int(os.getenv('MODEL_MAX_ESCALATIONS', 1))
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('MODEL_ROUTER_WORKERS', 16)),
+                                            thread_name_prefix='model-router')
+
+    def model_for(self, operation: str, tier: Optional[str] = None) -> str:
+        """Return the model configured for an operation (or an explicit tier)."""
+        return self.tiers[tier or self.routes.get(operation, 'standard')]
+
+    def complete(self, client, operation: str, validate: Optional[Callable[[Any], Any]] = None,
+                 **kwargs) -> Tuple[Any, Any]:
+        """Run a chat completion for an operation.
+
+        `validate` receives the raw response and returns the parsed result, or None if the
+        response is unusable. Invalid responses are retried on the next stronger tier, up to
+        `max_escalations` times. Returns the (response, parsed result) of the last attempt.
+        """
+        tiers = self._escalation_path(self.routes.get(operation, 'standard'))
+        response, result = None, None
+
+        for attempt, tier in enumerate(tiers):
+            route = f'{operation}:{tier}'
+            model = self.tiers[tier]
+            start = time.monotonic()
+            response, hedged = self._call_with_hedge(client, route, model, kwargs)
+            latency = time.monotonic() - start
+
+            result = validate(response) if validate else response
+            valid = result is not None
+            self._record(route, model, latency, valid, hedged, escalated=attempt > 0)
+
+            if valid:
+                return response, result
+            if attempt + 1 < len(tiers):
+                print(f"Validation failed for {route}, escalating to {tiers[attempt + 1]}...")
+
+        return response, result
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return per-route latency and validity statistics for calls made in this process."""
+        with self._lock:
+            snapshot = {}
+            for route, s in self._stats.items():
+                latencies = sorted(s['latencies'])
+                snapshot[route] = {
+                    'model': s['model'],
+                    'calls': s['calls'],
+                    'valid': s['valid'],
+                    'validity_rate': s['valid'] / s['calls'] if s['calls'] else None,
+                    'hedged': s['hedged'],
+                    'escalated': s['escalated'],
+                    'latency_p50': self._percentile(latencies, 50),
+                    'latency_p95': self._percentile(latencies, 95),
+                    'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+                }
+            return snapshot
+
+    def _escalation_path(self, tier: str) -> List[str]:
+        """Return the tiers to try, starting at `tier`.
+
+        Tiers mapped to the same model as the previous step are skipped, since retrying an
+        invalid response on the same model is not an escalation.
+        """
+        if tier not in ESCALATION_ORDER:
+            return [tier]
+        path = [tier]
+        for candidate in ESCALATION_ORDER[ESCALATION_ORDER.index(tier) + 1:]:
+            if len(path) > self.max_escalations:
+                break
+            if self.tiers[candidate] != self.tiers[path[-1]]:
+                path.append(candidate)
+        return path
+
+    def _hedge_delay(self, route: str) -> Optional[float]:
+        """Latency after which a backup request is fired, or None if there is too little data."""
+        with self._lock:
+            s = self._stats.get(route)
+            if not s or len(s['latencies']) < self.hedge_min_samples:
+                return None
+            return self._percentile(sorted(s['latencies']), self.hedge_percentile)
+
+    def _call_with_hedge(self, client, route: str, model: str, kwargs: Dict) -> Tuple[Any, bool]:
+        """Call the model, firing a backup request if the primary is slower than usual."""
+        delay = self._hedge_delay(route)
+        if delay is None:
+            return client.chat.completions.create(model=model, **kwargs), False
+
+        primary = self._executor.submit(client.chat.completions.create, model=model, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result(), False
+
+        print(f"Primary call for {route} exceeded p{self.hedge_percentile:g} ({delay:.2f}s), hedging...")
+        backup = self._executor.submit(client.chat.completions.create, model=model, **kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), True
+                error = future.exception()
+        raise error
+
+    def _record(self, route: str, model: str, latency: float, valid: bool, hedged: bool, escalated: bool) -> None:
+        """Record the outcome of a routed call."""
+        with self._lock:
+            s = self._stats.setdefault(route, {
+                'model': model,
+                'calls': 0,
+                'valid': 0,
+                'hedged': 0,
+                'escalated': 0,
+                'latencies': deque(maxlen=self.window),
+            })
+            s['model'] = model
+            s['calls'] += 1
+            s['valid'] += int(valid)
+            s['hedged'] += int(hedged)
+            s['escalated'] += int(escalated)
+            s['latencies'].append(latency)
+
+    @staticmethod
+    def _percentile(values: List[float], percentile: float) -> Optional[float]:
+        """Nearest-rank percentile of a sorted list."""
+        if not values:
+            return None
+        rank = max(0, min(len(values) - 1, int(round(percentile / 100 * len(values))) - 1))
+        return values[rank]
+
+
+# Shared across agent instances so latency history survives per-request agents
+router = ModelRouter()
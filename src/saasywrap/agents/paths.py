@@ -0,0 +1,16 @@
+import os
+
+# Everything the app and its workers share on disk (uploads, the job queue, change logs and
+# preview databases) lives under one data directory: SAASYWRAP_DATA_DIR, or the repository
+# root by default. Point it at a shared mount when workers run on other hosts.
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')
+
+
+def data_dir() -> str:
+    """The absolute data directory, read when called so a .env file loaded later applies."""
+    return os.path.abspath(os.getenv('SAASYWRAP_DATA_DIR') or DEFAULT_DATA_DIR)
+
+
+def data_path(*parts: str) -> str:
+    """An absolute path under the data directory. Absolute parts are returned unchanged."""
+    return os.path.join(data_dir(), *parts)
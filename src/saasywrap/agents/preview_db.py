@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from itertools import islice
+from typing import List, Dict, Any, Optional
+
+import pandas as pd
+
+from agents.datasets import load_dataset, dataset_fingerprint
+from agents.generate_schema import SchemaAgent, coerce_series
+from agents.paths import data_path
+from agents.session_registry import SessionRegistry
+
+# Rows passed to each executemany call while loading
+BATCH_SIZE = 50000
+
+_databases = SessionRegistry()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_values(s: pd.Series, column: Dict) -> List[Any]:
+    """Convert a typed column to values sqlite3 can bind, with None for missing values."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        formatted = s.dt.strftime('%Y-%m-%d' if column['sql_type'] == 'DATE' else '%Y-%m-%d %H:%M:%S')
+        return formatted.astype(object).where(s.notna(), None).tolist()
+    if pd.api.types.is_bool_dtype(s):
+        return s.astype(int).tolist()
+    if pd.api.types.is_numeric_dtype(s):
+        if not s.isna().any():
+            return s.tolist()
+        return s.astype(object).where(s.notna(), None).tolist()
+    return [None if v is None or (not isinstance(v, str) and pd.isna(v))
+            else v if isinstance(v, (str, int, float)) else str(v)
+            for v in s.tolist()]
+
+
+class PreviewDatabase:
+    """Per-session SQLite database holding the generated schema, loaded with the dataset.
+
+    The database is built once per schema and dataset version, into a scratch file that
+    replaces the session's database when complete, and reused by every later transform.
+    Tables are bulk-loaded in a single transaction with batched executemany calls, and
+    foreign key columns are indexed once the rows are in.
+    """
+
+    def __init__(self, session_id: str, db_dir: str = None):
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', session_id or ''):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        self.session_id = session_id
+        self.db_dir = db_dir or data_path(os.getenv('PREVIEW_DB_FOLDER', 'preview_dbs'))
+        self.path = os.path.join(self.db_dir, f'{session_id}.sqlite')
+        os.makedirs(self.db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_session(cls, session_id: str) -> 'PreviewDatabase':
+        """Return the shared preview database for a session."""
+        return _databases.get(session_id, cls)
+
+    def load(self, schema: Dict, dataset_path: str) -> bool:
+        """Make the database match a schema and dataset. Returns False if it already did."""
+        ddl = SchemaAgent().to_ddl(schema, quote=True)
+        version = hashlib.sha256(json.dumps([ddl, schema, list(dataset_fingerprint(dataset_path))],
+                                            sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            if self._version() == version:
+                return False
+
+            fd, scratch = tempfile.mkstemp(dir=self.db_dir, suffix='.part')
+            os.close(fd)
+            try:
+                self._build(scratch, schema, ddl, load_dataset(dataset_path), version)
+                os.replace(scratch, self.path)
+            finally:
+                if os.path.exists(scratch):
+                    os.remove(scratch)
+            return True
+
+    def _version(self) -> Optional[str]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT version FROM _preview_meta").fetchone()
+            return row['version'] if row else None
+        except sqlite3.Error:
+            return None
+
+    def _build(self, path: str, schema: Dict, ddl: str, dfs: Dict[str, pd.DataFrame], version: str) -> None:
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            # A scratch file that is discarded on failure needs no journal
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            # Enum checks are documentation here; rows are never rejected for them
+            conn.execute("PRAGMA ignore_check_constraints = ON")
+            conn.executescript(ddl)
+            conn.execute("BEGIN")
+            for table in schema['tables']:
+                df = dfs.get(table['source_sheet'])
+                if df is not None:
+                    self._insert(conn, table, df)
+            for table in schema['tables']:
+                for fk in table.get('foreign_keys', []):
+                    index_name = _quote(f"ix_{table['name']}_{fk['column']}")
+                    conn.execute(f"CREATE INDEX {index_name} ON {_quote(table['name'])} ({_quote(fk['column'])})")
+            conn.execute("CREATE TABLE _preview_meta (version TEXT)")
+            conn.execute("INSERT INTO _preview_meta VALUES (?)", (version,))
+            conn.execute("COMMIT")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, table: Dict, df: pd.DataFrame) -> None:
+        columns = []
+        for column in table['columns']:
+            if column.get('surrogate'):
+                columns.append(range(1, len(df) + 1))
+            else:
+                columns.append(_sql_values(coerce_series(df[column['source_column']], column), column))
+        names = ", ".join(_quote(c['name']) for c in table['columns'])
+        placeholders = ", ".join("?" for _ in table['columns'])
+        # Rows breaking a key constraint are skipped rather than failing the whole load
+        sql = f"INSERT OR IGNORE INTO {_quote(table['name'])} ({names}) VALUES ({placeholders})"
+        # Rows are built one batch at a time, never all at once
+        rows = zip(*columns)
+        while batch := list(islice(rows, BATCH_SIZE)):
+            conn.executemany(sql, batch)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Run a read query and return the rows as dicts."""
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def row_counts(self, schema: Dict) -> Dict[str, int]:
+        """Rows loaded into each schema table."""
+        return {t['name']: self.query(f"SELECT COUNT(*) AS n FROM {_quote(t['name'])}")[0]['n']
+                for t in schema['tables']}
@@ -0,0 +1,198 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnSketch:
+    """One-pass summary of a column's distinct values.
+
+    Columns with at most `exact_limit` distinct values keep every value hash; larger ones
+    keep a bottom-k (KMV) sketch of the smallest hashes, which estimates distinct counts
+    and set overlap without revisiting the data. Larger unique columns, the ones that can be
+    referenced as keys, also keep every hash in `members` so containment in them is exact.
+    """
+
+    def __init__(self, table: str, column: str, series: pd.Series, k: int, exact_limit: int):
+        self.table = table
+        self.column = column
+        non_null = series.dropna()
+        self.non_null = len(non_null)
+        self.kind = self._kind(series)
+
+        values = pd.unique(non_null.to_numpy())
+        if self.kind == 'text':
+            values = pd.Series(values).astype(str).str.strip().to_numpy()
+        elif self.kind == 'number':
+            # 1 and 1.0 should hash the same
+            values = values.astype('float64')
+        if self.kind == 'text':
+            # Stripping can merge values
+            values = pd.unique(values)
+        hashes = pd.util.hash_array(values, categorize=False)
+
+        self.distinct = len(hashes)
+        self.exact = self.distinct <= exact_limit
+        self.unique = self.non_null > 0 and self.distinct == self.non_null
+        # Integer keys numbered 1..n (or any dense range) overlap with small counts by coincidence
+        self.sequential = (self.kind == 'number' and self.distinct > 0 and bool(np.all(values == np.floor(values)))
+                           and values.max() - values.min() + 1 == self.distinct)
+        self.members = hashes if self.unique and not self.exact else None
+        if not self.exact:
+            # Only the k smallest hashes are kept; partitioning avoids a full sort
+            hashes = np.partition(hashes, k)[:k]
+        self.hashes = np.sort(hashes)
+        self.k = k
+
+    @staticmethod
+    def _kind(series: pd.Series) -> str:
+        if pd.api.types.is_bool_dtype(series):
+            return 'bool'
+        if pd.api.types.is_numeric_dtype(series):
+            return 'number'
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return 'datetime'
+        return 'text'
+
+    def containment_in(self, other: 'ColumnSketch', min_checked: int = 64) -> Optional[float]:
+        """Estimate the fraction of this column's distinct values found in `other`.
+
+        Returns None when too few values can be checked against `other` to tell.
+        """
+        if not self.distinct:
+            return 0.0
+        if self.exact and other.exact:
+            return len(np.intersect1d(self.hashes, other.hashes, assume_unique=True)) / self.distinct
+        if other.members is not None:
+            # Exact for an exact column; otherwise the bottom-k hashes are a uniform sample of its values
+            return float(np.isin(self.hashes, other.members, assume_unique=True).mean())
+        if self.exact:
+            # Only values below the other sketch's threshold can be checked
+            threshold = other.hashes[-1]
+            checked = self.hashes[self.hashes <= threshold]
+            if len(checked) < min(min_checked, self.distinct):
+                return None
+            return len(np.intersect1d(checked, other.hashes, assume_unique=True)) / len(checked)
+
+        # KMV: the k smallest hashes of the union estimate the Jaccard similarity
+        k = min(self.k, other.k)
+        union = np.union1d(self.hashes, other.hashes)[:k]
+        both = np.intersect1d(self.hashes, other.hashes, assume_unique=True)
+        jaccard = np.isin(union, both, assume_unique=True).sum() / len(union)
+        intersection = jaccard * (self.distinct + other.distinct) / (1 + jaccard)
+        return float(min(1.0, intersection / self.distinct))
+
+
+class RelationshipDetector:
+    """Finds likely foreign key relationships between sheets.
+
+    Every column is sketched once. Candidate pairs are then restricted to a referencing
+    column and a unique column of another sheet with a compatible type and no more distinct
+    values, and ranked by estimated containment, so no pair of columns is ever scanned.
+    A sequentially numbered key contains any small integer column, so references to one
+    need a matching name or must cover at least `min_sequential_coverage` of its values.
+    """
+
+    def __init__(self, k: int = 1024, exact_limit: int = 4096, min_containment: float = 0.9,
+                 min_distinct: int = 2, min_sequential_coverage: float = 0.5, min_sequential_distinct: int = 20):
+        self.k = k
+        self.exact_limit = exact_limit
+        self.min_containment = min_containment
+        self.min_distinct = min_distinct
+        self.min_sequential_coverage = min_sequential_coverage
+        self.min_sequential_distinct = min_sequential_distinct
+
+    def sketch(self, dfs: Dict[str, pd.DataFrame]) -> List[ColumnSketch]:
+        """Sketch every column of every sheet."""
+        return [ColumnSketch(table, column, df[column], self.k, self.exact_limit)
+                for table, df in dfs.items() for column in df.columns]
+
+    def detect(self, dfs: Dict[str, pd.DataFrame], primary_keys: Optional[Dict[str, List[str]]] = None,
+               preferred_keys: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Return candidate foreign keys, best first.
+
+        `primary_keys` maps sheet names to the source columns that may be referenced; by
+        default every unique column is a candidate. References to a sheet's entry in
+        `preferred_keys` (its chosen primary key) rank higher.
+        """
+        preferred_keys = preferred_keys or {}
+        sketches = self.sketch(dfs)
+        if primary_keys is not None:
+            referenced = [s for s in sketches if s.column in primary_keys.get(s.table, [])]
+        else:
+            referenced = [s for s in sketches if s.unique]
+        referenced = [s for s in referenced if s.kind != 'bool' and s.distinct >= self.min_distinct]
+
+        candidates = []
+        for fk in sketches:
+            if fk.kind == 'bool' or fk.distinct < self.min_distinct:
+                continue
+            is_own_key = preferred_keys.get(fk.table) == fk.column
+            for pk in referenced:
+                if pk.table == fk.table or pk.kind != fk.kind or fk.distinct > pk.distinct:
+                    continue
+                # Surrogate keys overlap by coincidence (1..n); only trust them when the names agree
+                if is_own_key and not self._names_match(fk, pk):
+                    continue
+                # Likewise counts and ratings fall inside any 1..n key without referencing it
+                if pk.sequential and not self._names_match(fk, pk) and (
+                        fk.distinct < self.min_sequential_coverage * pk.distinct
+                        or fk.distinct < self.min_sequential_distinct):
+                    continue
+                containment = fk.containment_in(pk)
+                if containment is None or containment < self.min_containment:
+                    continue
+                candidates.append({
+                    'table': fk.table,
+                    'column': fk.column,
+                    'referenced_table': pk.table,
+                    'referenced_column': pk.column,
+                    'containment': round(containment, 4),
+                    'cardinality': fk.distinct / pk.distinct,
+                    'score': self._score(fk, pk, containment, preferred_keys.get(pk.table) == pk.column),
+                })
+
+        candidates.sort(key=lambda c: -c['score'])
+        return self._best_per_column(candidates)
+
+    @staticmethod
+    def _normalize(name) -> str:
+        return str(name).strip().lower().replace(' ', '_')
+
+    def _names_match(self, fk: ColumnSketch, pk: ColumnSketch) -> bool:
+        """Whether the referencing column is named after the referenced column or table."""
+        fk_name = self._normalize(fk.column)
+        pk_table = self._normalize(pk.table).rstrip('s')
+        return fk_name == self._normalize(pk.column) or bool(pk_table and pk_table in fk_name)
+
+    def _score(self, fk: ColumnSketch, pk: ColumnSketch, containment: float, preferred: bool) -> float:
+        """Rank by containment, then by how key-like the names and cardinalities look."""
+        fk_name = self._normalize(fk.column)
+        pk_table = self._normalize(pk.table).rstrip('s')
+        score = containment
+        if fk_name == self._normalize(pk.column):
+            score += 0.5
+        if pk_table and pk_table in fk_name:
+            score += 0.3
+        # A referencing column usually repeats values; a unique one is more likely 1:1 or a coincidence
+        if not fk.unique:
+            score += 0.1
+        if preferred:
+            score += 0.2
+        return round(score, 4)
+
+    @staticmethod
+    def _best_per_column(candidates: List[Dict]) -> List[Dict]:
+        """Keep the best referenced column for each referencing column, and one direction per pair."""
+        seen = set()
+        accepted = set()
+        best = []
+        for candidate in candidates:
+            key = (candidate['table'], candidate['column'])
+            referenced = (candidate['referenced_table'], candidate['referenced_column'])
+            if key in seen or (referenced, key) in accepted:
+                continue
+            seen.add(key)
+            accepted.add((key, referenced))
+            best.append(candidate)
+        return best
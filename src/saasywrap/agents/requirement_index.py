@@ -0,0 +1,170 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agents.session_registry import SessionRegistry
+
+_indexes = SessionRegistry()
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'for', 'from', 'has', 'have', 'in',
+    'is', 'it', 'its', 'of', 'on', 'or', 'should', 'that', 'the', 'their', 'this', 'to', 'will',
+    'with', 'all', 'each', 'must', 'allow', 'user', 'users', 'system',
+}
+# Title and tag terms count this many times as often as description terms
+FIELD_WEIGHTS = {'title': 2, 'tags': 2, 'description': 1}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words, with plural 's' stripped."""
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', str(text).lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class RequirementIndex:
+    """BM25 inverted index over requirement titles, descriptions and tags.
+
+    `update` only re-tokenizes requirements whose text changed since the last call, so
+    keeping the index in step with a session's requirements costs little per chat turn.
+    Prompts then carry the top-k requirements for a query plus any explicitly referenced
+    ones, instead of every requirement in the project.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, top_k: int = None, duplicate_threshold: float = None):
+        self.k1 = k1
+        self.b = b
+        self.top_k = top_k or int(os.getenv('REQUIREMENTS_TOP_K', 12))
+        # Reworded requirements typically score 0.4-0.6, unrelated ones below 0.1
+        self.duplicate_threshold = duplicate_threshold or float(os.getenv('REQUIREMENTS_DUPLICATE_THRESHOLD', 0.35))
+        self._docs = {}  # requirement id -> (signature, term counts, length)
+        self._postings = {}  # term -> {requirement id: term count}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_session(cls, session_id: Optional[str]) -> 'RequirementIndex':
+        """Return the shared index for a session, or a fresh one without a session."""
+        if not session_id:
+            return cls()
+        # An evicted index is rebuilt by the next update
+        return _indexes.get(session_id, lambda _: cls())
+
+    @staticmethod
+    def _signature(req: Dict) -> Tuple:
+        return (req.get('title'), req.get('description'), tuple(req.get('tags') or []))
+
+    def update(self, requirements: Iterable[Dict]) -> None:
+        """Bring the index in line with `requirements`, indexing only what changed."""
+        with self._lock:
+            seen = set()
+            for req in requirements:
+                req_id = req.get('id')
+                if not req_id:
+                    continue
+                seen.add(req_id)
+                signature = self._signature(req)
+                doc = self._docs.get(req_id)
+                if doc and doc[0] == signature:
+                    continue
+                if doc:
+                    self._remove(req_id)
+                self._add(req_id, signature, req)
+            for req_id in [r for r in self._docs if r not in seen]:
+                self._remove(req_id)
+
+    def _add(self, req_id: str, signature: Tuple, req: Dict) -> None:
+        counts = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = req.get(field) or ''
+            text = ' '.join(value) if isinstance(value, list) else value
+            for token in tokenize(text):
+                counts[token] += weight
+        length = sum(counts.values())
+        self._docs[req_id] = (signature, counts, length)
+        self._total_length += length
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[req_id] = count
+
+    def _remove(self, req_id: str) -> None:
+        _, counts, length = self._docs.pop(req_id)
+        self._total_length -= length
+        for term in counts:
+            postings = self._postings[term]
+            del postings[req_id]
+            if not postings:
+                del self._postings[term]
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """The ids and BM25 scores of the `k` requirements best matching `query`."""
+        with self._lock:
+            if not self._docs:
+                return []
+            average_length = self._total_length / len(self._docs) or 1
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(term)
+                for req_id, count in postings.items():
+                    length = self._docs[req_id][2]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[req_id] += idf * count * (self.k1 + 1) / (count + norm)
+            return scores.most_common(k)
+
+    def select(self, requirements: List[Dict], query: str, requirement_ids: Optional[Iterable[str]] = None,
+               k: int = None) -> List[Dict]:
+        """The requirements named in `requirement_ids`, plus up to `k` others relevant to `query`.
+
+        Requirements keep their original order. Small projects are returned whole.
+        """
+        k = self.top_k if k is None else k
+        explicit = set(requirement_ids or [])
+        if len(requirements) <= k + len(explicit):
+            return list(requirements)
+        self.update(requirements)
+        ranked = [req_id for req_id, score in self.search(query, k + len(explicit)) if req_id not in explicit]
+        selected = explicit | set(ranked[:k])
+        return [req for req in requirements if req.get('id') in selected]
+
+    def near_duplicates(self, requirement_ids: Optional[Iterable[str]] = None,
+                        threshold: float = None) -> List[Tuple[str, str, float]]:
+        """Pairs of requirements whose TF-IDF cosine similarity is at least `threshold`.
+
+        Only pairs involving `requirement_ids` are checked when given. Candidates are found
+        through shared terms in the inverted index, so unrelated requirements are never compared.
+        """
+        threshold = self.duplicate_threshold if threshold is None else threshold
+        with self._lock:
+            idf = {term: self._idf(term) for term in self._postings}
+            norms = {req_id: math.sqrt(sum((count * idf[t]) ** 2 for t, count in doc[1].items()))
+                     for req_id, doc in self._docs.items()}
+            ids = [r for r in (self._docs if requirement_ids is None else requirement_ids) if r in self._docs]
+            pairs = {}
+            for req_id in ids:
+                dots = Counter()
+                for term, count in self._docs[req_id][1].items():
+                    weight = count * idf[term] ** 2
+                    for other, other_count in self._postings[term].items():
+                        if other != req_id:
+                            dots[other] += weight * other_count
+                for other, dot in dots.items():
+                    if not norms[req_id] or not norms[other]:
+                        continue
+                    similarity = dot / (norms[req_id] * norms[other])
+                    if similarity >= threshold:
+                        pairs[tuple(sorted((req_id, other)))] = round(similarity, 3)
+            return sorted(((a, b, s) for (a, b), s in pairs.items()), key=lambda p: -p[2])
@@ -0,0 +1,34 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple
+
+
+class SessionRegistry:
+    """Shared per-session objects, keeping only the most recently used sessions in memory.
+
+    Evicted objects are rebuilt by their factory on next use, so anything they hold must be
+    recoverable from disk or cheap to recompute.
+    """
+
+    def __init__(self, max_sessions: int = None):
+        self.max_sessions = max_sessions or int(os.getenv('MAX_ACTIVE_SESSIONS', 256))
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, factory: Callable[[str], Any]) -> Any:
+        """Return the object for a session, creating it with `factory` if it is not held."""
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                item = factory(session_id)
+                self._items[session_id] = item
+            self._items.move_to_end(session_id)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+            return item
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """A snapshot of the held sessions and their objects, least recently used first."""
+        with self._lock:
+            return list(self._items.items())
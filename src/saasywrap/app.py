@@ -1,10 +1,22 @@
-from flask import Flask, request, jsonify, render_template
-from werkzeug.utils import secure_filename
+from flask import Flask, Request, Response, request, jsonify, render_template
+import json
+import time
 import os
+import uuid
 from dotenv import load_dotenv
 import pandas as pd
 from agents.generate_requirements import RequirementsAgent
-from agents.generate_blueprint import BlueprintAgent
+from agents.generate_blueprint import BlueprintAgent, transform_requirements
+from agents.generate_view import ViewAgent
+from agents.model_router import router
+from agents.change_log import ChangeLog
+from agents.requirement_index import RequirementIndex
+from prefetch import SpeculativeCache, input_hash
+from job_queue import JobQueue, start_worker_threads, COMPLETED, FAILED
+from worker import HANDLERS, is_transient
+from upload_store import UploadStore
+from agents.datasets import dataset_fingerprint
+from agents.paths import data_path
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,11 +25,113 @@ app = Flask(__name__,
            static_url_path='',
            static_folder='.',
            template_folder='templates')
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOAD_FOLDER'] = data_path(os.getenv('UPLOAD_FOLDER', 'uploads'))
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.config['PREFETCH_STABLE_SECONDS'] = float(os.getenv('PREFETCH_STABLE_SECONDS', 5))
+
+# Uploads are stored by content hash, with sheets converted to columnar files on ingest
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'])
+
+class UploadRequest(Request):
+    """Writes uploaded files straight into the upload store while the body is parsed."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.open_spool()
+
+app.request_class = UploadRequest
+
+# Speculative results for the next workflow stage, keyed by input hash
+prefetch_cache = SpeculativeCache()
+
+# Transforms run as durable jobs, picked up by worker.py processes and by the
+# in-process workers create_app starts
+job_queue = JobQueue()
+# How long the synchronous transform endpoint waits before handing back the job id
+app.config['JOB_WAIT_SECONDS'] = float(os.getenv('JOB_WAIT_SECONDS', 30))
+# How long a job's event stream stays open
+app.config['JOB_STREAM_SECONDS'] = float(os.getenv('JOB_STREAM_SECONDS', 300))
+
+REQUIREMENT_CONTENT_FIELDS = ('id', 'title', 'description', 'importance', 'category', 'tags')
+TRANSFORM_CONTENT_FIELDS = ('id', 'title', 'description', 'transform_type', 'requirement_ids', 'dependencies')
+# Preview state keys read by transforms that run locally against the dataset
+LOCAL_TRANSFORM_STATE = {
+    'schema': (),
+    'form': ('schema',),
+    'view': ('schema',),
+    'dashboard': ('schema',),
+}
+
+def _blueprint_inputs(requirements):
+    """The parts of the requirements that determine the generated blueprint."""
+    return [{k: req.get(k) for k in REQUIREMENT_CONTENT_FIELDS} for req in requirements]
+
+def _state_read_by(transform, preview_state, dataset_path=None):
+    """The part of the preview state a transform's execution depends on."""
+    keys = LOCAL_TRANSFORM_STATE.get(transform.get('transform_type'))
+    if keys is None or not dataset_path:
+        return preview_state
+    return {k: preview_state[k] for k in keys if k in preview_state}
+
+def _transform_inputs(transform, requirements, preview_state, dataset_path=None, session_id=None):
+    """The parts of a transform and its context that determine its execution result."""
+    return {
+        'transform': {k: transform.get(k) for k in TRANSFORM_CONTENT_FIELDS},
+        # Its own requirements and the related ones its prompt includes
+        'requirements': _blueprint_inputs(transform_requirements(transform, requirements, session_id)),
+        'preview_state': preview_state,
+        'dataset': list(dataset_fingerprint(dataset_path)) if dataset_path and os.path.exists(dataset_path) else None,
+    }
+
+def _blueprint_is_usable(result):
+    return bool(result.get('blueprint'))
+
+def _compute_blueprint(requirements):
+    agent = BlueprintAgent()
+    return agent.generate_initial_blueprint(requirements)
+
+def _dataset_path(path):
+    """A client-supplied dataset path, made absolute against the shared data directory."""
+    return data_path(path) if path else None
+
+def _submit_transform(transform_id, blueprint, requirements, preview_state, dataset_path=None, session_id=None):
+    """Queue a transform execution. Identical inputs within a session share one job.
+
+    Only the preview state the transform reads is passed on, so a result computed before
+    unrelated transforms ran is still reused; clients merge the returned state into theirs.
+    """
+    # Workers may run from another directory or host, so the payload path is absolute
+    dataset_path = _dataset_path(dataset_path)
+    transform = next((t for t in blueprint if t.get('id') == transform_id), None)
+    if transform:
+        preview_state = _state_read_by(transform, preview_state, dataset_path)
+    idempotency_key = input_hash('transform', {
+        'session': session_id,
+        'inputs': _transform_inputs(transform, requirements, preview_state, dataset_path, session_id),
+    }) if transform else None
+    return job_queue.submit('transform', {
+        'transformId': transform_id,
+        'blueprint': blueprint,
+        'requirements': requirements,
+        'previewState': preview_state,
+        'datasetPath': dataset_path,
+        'sessionId': session_id,
+    }, idempotency_key)
+
+def _job_response(job):
+    """The client-facing view of a job."""
+    return {
+        'jobId': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'result': job['result'],
+        'error': job['error'],
+    }
+
+def _prefetch_root_transforms(session_id, blueprint, requirements, dataset_path=None):
+    """Queue transforms without dependencies against an empty preview state."""
+    for transform in blueprint:
+        if not transform.get('dependencies'):
+            _submit_transform(transform['id'], blueprint, requirements, {}, dataset_path, session_id)
 
 @app.route('/')
 def index():
@@ -33,21 +147,28 @@ def generate_requirements():
         initial_requirements = request.form.get('requirements', '')
         file = request.files.get('dataset')
         if file:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            try:
+                file_path = upload_store.save(file.stream, file.filename)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
     else:
         data = request.json
         if data:
             initial_requirements = data.get('requirements', '')
     
+    # Each session gets its own requirement change log
+    session_id = uuid.uuid4().hex
+    
     # Initialize the requirements agent
     agent = RequirementsAgent()
+    agent.change_log = ChangeLog.for_session(session_id)
+    agent.requirement_index = RequirementIndex.for_session(session_id)
     requirements = agent.generate_initial_requirements(initial_requirements, file_path)
     
     response_data = {
         'requirements': requirements,
-        'response': agent.get_initial_response()
+        'response': agent.get_initial_response(),
+        'sessionId': session_id
     }
     
     # Include the dataset path in response if a file was uploaded
@@ -73,8 +194,17 @@ def requirements_chat():
     # Set the current requirements
     agent.requirements = current_requirements
     
+    # Record changes in the session's change log
+    session_id = initial_context.get('sessionId')
+    if session_id:
+        try:
+            agent.change_log = ChangeLog.for_session(session_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        agent.requirement_index = RequirementIndex.for_session(session_id)
+    
     # Parse dataset if exists
-    dataset_path = initial_context.get('datasetPath')
+    dataset_path = _dataset_path(initial_context.get('datasetPath'))
     if dataset_path:
         agent.parse_dataset(dataset_path)
     
@@ -90,26 +220,155 @@ def requirements_chat():
         'requirements': updated_requirements,
     })
 
+@app.route('/api/requirements/<requirement_id>/history', methods=['GET'])
+def requirement_history(requirement_id):
+    session_id = request.args.get('sessionId', '')
+    try:
+        change_log = ChangeLog.for_session(session_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'id': requirement_id,
+        'version': change_log.version(requirement_id),
+        'changeHistory': change_log.history(requirement_id)
+    })
+
+@app.route('/api/requirements/<requirement_id>/history', methods=['POST'])
+def append_requirement_history(requirement_id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        change_log = ChangeLog.for_session(data.get('sessionId', ''))
+        version = change_log.append(requirement_id, data.get('entry'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'id': requirement_id, 'version': version})
+
 @app.route('/api/generate-blueprint', methods=['POST'])
 def generate_blueprint():
     data = request.json
     requirements = data.get('requirements', [])
+    session_id = data.get('sessionId', '')
+    dataset_path = data.get('datasetPath')
     
-    agent = BlueprintAgent()
-    result = agent.generate_initial_blueprint(requirements)
+    # Served instantly if the blueprint was prefetched for these exact requirements
+    result, _ = prefetch_cache.get(
+        'blueprint',
+        _blueprint_inputs(requirements),
+        lambda: _compute_blueprint(requirements),
+        scope=session_id,
+        cacheable=_blueprint_is_usable
+    )
+    
+    # The blueprint is accepted: start on the transforms that can run first
+    if result.get('blueprint'):
+        _prefetch_root_transforms(session_id, result['blueprint'], requirements, dataset_path)
     
     return jsonify(result)
 
+@app.route('/api/prefetch/blueprint', methods=['POST'])
+def prefetch_blueprint():
+    data = request.json
+    requirements = data.get('requirements', [])
+    session_id = data.get('sessionId', '')
+    
+    if requirements:
+        prefetch_cache.prefetch_when_stable(
+            'blueprint',
+            _blueprint_inputs(requirements),
+            lambda: _compute_blueprint(requirements),
+            delay=app.config['PREFETCH_STABLE_SECONDS'],
+            scope=session_id,
+            cacheable=_blueprint_is_usable
+        )
+    else:
+        prefetch_cache.invalidate('blueprint', scope=session_id)
+    
+    return jsonify({'scheduled': bool(requirements)})
+
 @app.route('/api/execute-blueprint-transform', methods=['POST'])
 def execute_blueprint_transform():
     data = request.json
     transform_id = data.get('transformId')
     preview_state = data.get('previewState', {})
+    blueprint = data.get('blueprint', [])
+    requirements = data.get('requirements', [])
+    session_id = data.get('sessionId', '')
+    dataset_path = data.get('datasetPath')
     
-    agent = BlueprintAgent()
-    result = agent.execute_transform(transform_id, preview_state)
+    # Served as soon as the job finishes; prefetched transforms may already have
+    job_id = _submit_transform(transform_id, blueprint, requirements, preview_state, dataset_path, session_id)
+    job = job_queue.wait(job_id, timeout=app.config['JOB_WAIT_SECONDS'])
     
-    return jsonify(result)
+    if job['status'] == COMPLETED:
+        result = job['result']
+        if result.get('previewState') is not None:
+            result['previewState'] = dict(preview_state, **result['previewState'])
+        return jsonify(result)
+    if job['status'] == FAILED:
+        return jsonify({'status': 'failed', 'message': job['error'], 'preview': None})
+    return jsonify({'status': 'in_progress', 'message': 'The transform is still running', 'preview': None, 'jobId': job_id})
+
+@app.route('/api/jobs/transform', methods=['POST'])
+def submit_transform_job():
+    data = request.json
+    job_id = _submit_transform(
+        data.get('transformId'),
+        data.get('blueprint', []),
+        data.get('requirements', []),
+        data.get('previewState', {}),
+        data.get('datasetPath'),
+        data.get('sessionId', '')
+    )
+    return jsonify(_job_response(job_queue.get(job_id))), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_response(job))
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    if not job_queue.get(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        # Server-sent events: one per status change, ending when the job finishes
+        last = None
+        deadline = time.time() + app.config['JOB_STREAM_SECONDS']
+        while time.time() < deadline:
+            job = job_queue.get(job_id)
+            state = (job['status'], job['attempts'])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(_job_response(job), default=str)}\n\n"
+            if job['status'] in (COMPLETED, FAILED):
+                return
+            time.sleep(0.25)
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/view-instances', methods=['POST'])
+def view_instances():
+    data = request.json
+    dataset_path = _dataset_path(data.get('datasetPath'))
+    schema = data.get('schema')
+    if not dataset_path or not os.path.exists(dataset_path) or not schema:
+        return jsonify({'error': 'A dataset and schema are required'}), 400
+    
+    try:
+        page = ViewAgent().browse(schema, dataset_path, data.get('table', ''), data.get('cursor'), data.get('key'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except (KeyError, TypeError, StopIteration) as e:
+        return jsonify({'error': f'Invalid schema: {e}'}), 400
+    
+    return jsonify(page)
 
 @app.route('/api/chat/blueprint', methods=['POST'])
 def blueprint_chat():
@@ -122,6 +381,7 @@ def blueprint_chat():
     
     # Initialize the blueprint agent
     agent = BlueprintAgent()
+    agent.session_id = data.get('sessionId')
     
     # Process the message with full context
     result = agent.process_message(
@@ -134,5 +394,15 @@ def blueprint_chat():
     
     return jsonify(result)
 
+@app.route('/api/model-routes/stats', methods=['GET'])
+def model_route_stats():
+    # Stats are kept per process: calls made by worker.py processes are not included
+    return jsonify(router.stats())
+
+def create_app() -> Flask:
+    """The app with its in-process transform workers started, for `flask run` and WSGI servers."""
+    start_worker_threads(job_queue, HANDLERS, int(os.getenv('JOB_WORKERS_IN_PROCESS', 4)), is_transient)
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,266 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from agents.paths import data_path
+
+# Job states; completed and failed are terminal
+QUEUED, RUNNING, COMPLETED, FAILED = 'queued', 'running', 'completed', 'failed'
+# Seconds between sweeps for finished jobs past their retention
+PURGE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, updated_at);
+"""
+
+
+class JobQueue:
+    """Durable job queue in a local SQLite database, shared by the web app and workers.
+
+    A worker claims a job by taking a lease on it and keeps the lease alive with
+    heartbeats. If a worker dies, its lease expires and the job is claimed again, so
+    submitted work survives restarts. Attempts that fail transiently are retried with
+    backoff up to `max_attempts`. Jobs submitted with the same idempotency key share one job, and only
+    the worker holding the current lease can record a job's outcome, so a retried job is
+    never completed twice. Finished jobs are deleted once they are `retention_days` old.
+    """
+
+    def __init__(self, path: str = None, lease_seconds: float = None, max_attempts: int = None,
+                 retry_delay: float = None, retention_days: float = None):
+        self.path = path or data_path(os.getenv('JOB_QUEUE_PATH', 'jobs/jobs.sqlite'))
+        self.lease_seconds = lease_seconds or float(os.getenv('JOB_LEASE_SECONDS', 60))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv('JOB_RETRY_DELAY', 2))
+        self.retention_days = retention_days or float(os.getenv('JOB_RETENTION_DAYS', 7))
+        self._next_purge = 0.0
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; writes that must be atomic open their own IMMEDIATE transaction
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, kind: str, payload: Dict, idempotency_key: str = None) -> str:
+        """Queue a job and return its id.
+
+        A job already submitted with the same key is returned instead, unless it failed,
+        in which case it is queued again.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = conn.execute("SELECT id, status FROM jobs WHERE idempotency_key = ?",
+                                        (idempotency_key,)).fetchone() if idempotency_key else None
+                if existing and existing['status'] != FAILED:
+                    job_id = existing['id']
+                elif existing:
+                    job_id = existing['id']
+                    conn.execute("""UPDATE jobs SET status = ?, attempts = 0, error = NULL, result = NULL,
+                                    payload = ?, available_at = ?, updated_at = ? WHERE id = ?""",
+                                 (QUEUED, json.dumps(payload), now, now, job_id))
+                else:
+                    job_id = uuid.uuid4().hex
+                    conn.execute("""INSERT INTO jobs (id, kind, idempotency_key, payload, status, max_attempts,
+                                    available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                 (job_id, kind, idempotency_key, json.dumps(payload), QUEUED, self.max_attempts,
+                                  now, now, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """Lease the next runnable job (queued, or running on an expired lease), if any."""
+        now = time.time()
+        kinds = list(kinds or [])
+        kind_filter = f"AND kind IN ({', '.join('?' for _ in kinds)})" if kinds else ""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose last allowed attempt lost its worker are given up on
+                conn.execute("""UPDATE jobs SET status = ?, error = 'Worker lease expired', updated_at = ?
+                                WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts""",
+                             (FAILED, now, RUNNING, now))
+                if now >= self._next_purge:
+                    self._next_purge = now + PURGE_INTERVAL
+                    conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                                 (COMPLETED, FAILED, now - self.retention_days * 86400))
+                row = conn.execute(f"""SELECT * FROM jobs
+                                       WHERE ((status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?))
+                                       {kind_filter} ORDER BY available_at LIMIT 1""",
+                                   (QUEUED, now, RUNNING, now, *kinds)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute("""UPDATE jobs SET status = ?, worker_id = ?, lease_expires = ?,
+                                attempts = attempts + 1, updated_at = ? WHERE id = ?""",
+                             (RUNNING, worker_id, now + self.lease_seconds, now, row['id']))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        job = self._to_dict(row)
+        job.update(status=RUNNING, worker_id=worker_id, attempts=row['attempts'] + 1)
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend a lease. Returns False if the worker no longer holds it."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute("""UPDATE jobs SET lease_expires = ?, updated_at = ?
+                                     WHERE id = ? AND worker_id = ? AND status = ?""",
+                                  (now + self.lease_seconds, now, job_id, worker_id, RUNNING))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        """Record a job's result. Returns False if the worker no longer holds its lease."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute("""UPDATE jobs SET status = ?, result = ?, error = NULL, lease_expires = NULL,
+                                     updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?""",
+                                  (COMPLETED, json.dumps(result, default=str), time.time(), job_id, worker_id, RUNNING))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt, queueing a retry with backoff while attempts remain.
+
+        With `retry` False the job fails straight away.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                                   (job_id, worker_id, RUNNING)).fetchone()
+                if row is not None:
+                    retry = retry and row['attempts'] < row['max_attempts']
+                    conn.execute("""UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, available_at = ?,
+                                    updated_at = ? WHERE id = ?""",
+                                 (QUEUED if retry else FAILED, error,
+                                  now + self.retry_delay * 2 ** (row['attempts'] - 1), now, job_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """A job's status, attempts and, once finished, its result or error."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def wait(self, job_id: str, timeout: float = None, interval: float = 0.25) -> Optional[Dict]:
+        """Poll a job until it finishes or `timeout` passes, and return its last state."""
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (COMPLETED, FAILED):
+                return job
+            if deadline is not None and time.time() >= deadline:
+                return job
+            time.sleep(interval)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+
+class Worker:
+    """Claims and runs jobs from a queue, heartbeating while a handler runs.
+
+    `handlers` maps job kinds to functions of the job payload. A handler that raises
+    fails the attempt. Errors for which `retryable` returns True are retried until the job
+    runs out of attempts; any other error fails the job at once.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Callable[[Dict], Any]],
+                 worker_id: str = None, poll_interval: float = None,
+                 retryable: Callable[[Exception], bool] = None):
+        self.queue = queue
+        self.handlers = handlers
+        self.retryable = retryable or (lambda e: True)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval or float(os.getenv('JOB_POLL_INTERVAL', 0.5))
+
+    def run_once(self) -> bool:
+        """Run one job if one is available. Returns whether a job was run."""
+        job = self.queue.claim(self.worker_id, self.handlers.keys())
+        if job is None:
+            return False
+
+        print(f"Worker {self.worker_id} running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handlers[job['kind']](job['payload'])
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(job['id'], self.worker_id, str(e) or e.__class__.__name__, self.retryable(e))
+        else:
+            if not self.queue.complete(job['id'], self.worker_id, result):
+                print(f"Worker {self.worker_id} lost the lease on job {job['id']}; result discarded")
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        while not done.wait(self.queue.lease_seconds / 3):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                return
+
+    def run(self, stop: threading.Event = None) -> None:
+        """Run jobs until `stop` is set."""
+        stop = stop or threading.Event()
+        print(f"Worker {self.worker_id} started")
+        while not stop.is_set():
+            try:
+                ran = self.run_once()
+            except sqlite3.Error as e:
+                print(f"Worker {self.worker_id} queue error: {str(e)}")
+                ran = False
+            if not ran:
+                stop.wait(self.poll_interval)
+
+
+def start_worker_threads(queue: JobQueue, handlers: Dict[str, Callable[[Dict], Any]], count: int,
+                         retryable: Callable[[Exception], bool] = None) -> None:
+    """Run workers as daemon threads of the current process."""
+    for i in range(count):
+        worker = Worker(queue, handlers, retryable=retryable)
+        threading.Thread(target=worker.run, name=f'job-worker-{i}', daemon=True).start()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+
+def input_hash(kind: str, inputs: Any) -> str:
+    """Stable hash of a kind and its JSON-serializable inputs."""
+    payload = json.dumps([kind, inputs], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SpeculativeCache:
+    """Background precomputation of workflow stages, cached against an input hash.
+
+    Results are keyed by (kind, hash of inputs), so a result is only ever served for the
+    exact inputs it was computed from. Each (kind, scope) slot keeps only its latest inputs:
+    submitting new inputs for a slot evicts the entries computed from older ones. A slot is
+    dropped with its last entry, so slots are bounded by `max_entries` like the entries.
+    """
+
+    def __init__(self, max_entries: int = 128, max_workers: int = None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (future, slot)
+        self._slots = {}  # (kind, scope) -> set of keys
+        self._timers = {}  # (kind, scope) -> threading.Timer
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv('PREFETCH_WORKERS', 4)),
+                                            thread_name_prefix='prefetch')
+
+    def prefetch(self, kind: str, inputs: Any, fn: Callable[[], Any], scope: str = '',
+                 cacheable: Optional[Callable[[Any], bool]] = None) -> str:
+        """Start computing `fn` in the background unless a result for these inputs exists."""
+        key = input_hash(kind, inputs)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return key
+            self._invalidate_slot((kind, scope), keep=key)
+            future = self._executor.submit(fn)
+            self._store(key, future, (kind, scope))
+        future.add_done_callback(lambda f: self._discard_if_unusable(key, f, cacheable))
+        print(f"Prefetching {kind} ({key[:12]})")
+        return key
+
+    def prefetch_when_stable(self, kind: str, inputs: Any, fn: Callable[[], Any], delay: float,
+                             scope: str = '', cacheable: Optional[Callable[[Any], bool]] = None) -> None:
+        """Prefetch once the inputs for a slot have stopped changing for `delay` seconds."""
+        slot = (kind, scope)
+        key = input_hash(kind, inputs)
+        with self._lock:
+            timer = self._timers.pop(slot, None)
+            if timer:
+                timer.cancel()
+            # Inputs changed: results for the old inputs must not be served for this slot
+            self._invalidate_slot(slot, keep=key)
+            if key in self._entries:
+                return
+            timer = threading.Timer(delay, self._fire_timer, args=(slot, kind, inputs, fn, scope, cacheable))
+            timer.daemon = True
+            self._timers[slot] = timer
+        timer.start()
+
+    def get(self, kind: str, inputs: Any, fn: Callable[[], Any], scope: str = '',
+            cacheable: Optional[Callable[[Any], bool]] = None, timeout: float = None) -> Tuple[Any, bool]:
+        """Return (result, hit). Waits for an in-flight prefetch, or computes inline on a miss."""
+        key = input_hash(kind, inputs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+        if entry:
+            future, _ = entry
+            try:
+                result = future.result(timeout=timeout)
+                if cacheable is None or cacheable(result):
+                    print(f"Prefetch hit for {kind} ({key[:12]})")
+                    return result, True
+            except Exception as e:
+                print(f"Prefetched {kind} failed, recomputing: {str(e)}")
+
+        result = fn()
+        if cacheable is None or cacheable(result):
+            future = Future()
+            future.set_result(result)
+            with self._lock:
+                self._invalidate_slot((kind, scope), keep=key)
+                self._store(key, future, (kind, scope))
+        return result, False
+
+    def invalidate(self, kind: str, scope: str = '') -> None:
+        """Drop every cached result and pending timer for a slot."""
+        with self._lock:
+            timer = self._timers.pop((kind, scope), None)
+            if timer:
+                timer.cancel()
+            self._invalidate_slot((kind, scope))
+
+    def _fire_timer(self, slot, kind, inputs, fn, scope, cacheable) -> None:
+        with self._lock:
+            if self._timers.get(slot) is not threading.current_thread():
+                return
+            del self._timers[slot]
+        self.prefetch(kind, inputs, fn, scope=scope, cacheable=cacheable)
+
+    def _store(self, key: str, future: Future, slot: Tuple[str, str]) -> None:
+        """Store an entry, evicting the least recently used ones. Caller holds the lock."""
+        self._entries[key] = (future, slot)
+        self._slots.setdefault(slot, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old_key, (_, old_slot) = self._entries.popitem(last=False)
+            self._discard_from_slot(old_slot, old_key)
+
+    def _invalidate_slot(self, slot: Tuple[str, str], keep: str = None) -> None:
+        """Evict a slot's entries other than `keep`. Caller holds the lock."""
+        for key in list(self._slots.get(slot, ())):
+            if key != keep:
+                self._entries.pop(key, None)
+                self._discard_from_slot(slot, key)
+
+    def _discard_from_slot(self, slot: Tuple[str, str], key: str) -> None:
+        """Remove a key from a slot, dropping the slot once it is empty. Caller holds the lock."""
+        keys = self._slots.get(slot)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._slots[slot]
+
+    def _discard_if_unusable(self, key: str, future: Future, cacheable) -> None:
+        """Evict failed or non-cacheable prefetch results so the next request recomputes."""
+        if future.exception() is None and (cacheable is None or cacheable(future.result())):
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] is future:
+                del self._entries[key]
+                self._discard_from_slot(entry[1], key)
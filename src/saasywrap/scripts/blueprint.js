@@ -68,7 +68,8 @@ class BlueprintManager {
         this.chatManager.setAdditionalRequestData(() => ({
             currentBlueprint: this.blueprint,
             previewState: this.previewState,
-            requirements: window.requirementsManager.requirements
+            requirements: window.requirementsManager.requirements,
+            sessionId: window.requirementsManager.initialContext.sessionId
         }));
         
         // Bind event listeners
@@ -168,7 +169,11 @@ class BlueprintManager {
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ requirements })
+                body: JSON.stringify({
+                    requirements,
+                    sessionId: window.requirementsManager.initialContext.sessionId,
+                    datasetPath: window.requirementsManager.initialContext.datasetPath
+                })
             });
             
             const data = await response.json();
@@ -298,20 +303,48 @@ class BlueprintManager {
         return icons[status] || '⭕';
     }
 
+    waitForJob(jobId) {
+        // Follow the job's event stream until it completes or fails
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/jobs/${jobId}/stream`);
+            source.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                if (job.status === 'completed' || job.status === 'failed') {
+                    source.close();
+                    resolve(job);
+                }
+            };
+            source.onerror = () => {
+                source.close();
+                reject(new Error(`Lost connection to job ${jobId}`));
+            };
+        });
+    }
+
     async executeTransform(transformId) {
         try {
-            const response = await fetch(`/api/execute-blueprint-transform`, {
+            const response = await fetch(`/api/jobs/transform`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
                     transformId,
-                    previewState: this.previewState
+                    previewState: this.previewState,
+                    blueprint: this.blueprint,
+                    requirements: window.requirementsManager.requirements,
+                    sessionId: window.requirementsManager.initialContext.sessionId,
+                    datasetPath: window.requirementsManager.initialContext.datasetPath
                 })
             });
             
-            const data = await response.json();
+            let job = await response.json();
+            if (job.status !== 'completed' && job.status !== 'failed') {
+                job = await this.waitForJob(job.jobId);
+            }
+            const data = job.status === 'completed'
+                ? job.result
+                : { status: 'failed', message: job.error, preview: null };
             
             // Update the preview
             if (data.preview) {
@@ -321,9 +354,9 @@ class BlueprintManager {
             // Update transform status
             this.updateTransformStatus(transformId, data.status);
             
-            // Store preview state
+            // Merge preview state; results may have been computed from part of it
             if (data.previewState) {
-                this.previewState = data.previewState;
+                this.previewState = { ...this.previewState, ...data.previewState };
             }
             
             // Add any messages from the agent
@@ -51,7 +51,8 @@ class ChatManager {
                 },
                 body: JSON.stringify({
                     message,
-                    chatHistory: this.conversation_history
+                    chatHistory: this.conversation_history,
+                    ...(this.getAdditionalRequestData ? this.getAdditionalRequestData() : {})
                 })
             });
             
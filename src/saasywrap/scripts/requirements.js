@@ -5,7 +5,8 @@ class RequirementsManager {
         this.initialContext = {
             requirements: '',
             datasetPath: null,
-            datasetName: null
+            datasetName: null,
+            sessionId: null
         };
         
         // DOM Elements
@@ -162,19 +163,69 @@ class RequirementsManager {
 
     enrichRequirement(req, isNew = false) {
         const now = new Date().toISOString();
-        return {
+        const enriched = {
             ...req,
             id: req.id || this.generateId(),
             dateModified: now,
             dateAdded: req.dateAdded || now,
             createdBy: req.createdBy || this.currentUserId,
-            changeHistory: req.changeHistory || [{
-                type: 'created',
-                timestamp: now,
-                userId: this.currentUserId,
-                details: isNew ? 'Requirement created by user' : 'Requirement generated by AI'
-            }]
+            version: req.version || 0
         };
+        // History is kept in the server-side change log and fetched on demand
+        delete enriched.changeHistory;
+        if (isNew) {
+            this.recordChange(enriched, 'created', 'Requirement created by user');
+        }
+        return enriched;
+    }
+
+    recordChange(req, type, details) {
+        req.version = (req.version || 0) + 1;
+        if (!this.initialContext.sessionId) return;
+        fetch(`/api/requirements/${encodeURIComponent(req.id)}/history`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                sessionId: this.initialContext.sessionId,
+                entry: {
+                    type,
+                    timestamp: new Date().toISOString(),
+                    userId: this.currentUserId,
+                    details
+                }
+            })
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.version) {
+                    req.version = data.version;
+                }
+            })
+            .catch(error => console.error('Error recording requirement change:', error));
+    }
+
+    async loadHistory(req, historyList) {
+        if (!this.initialContext.sessionId) {
+            historyList.innerHTML = '<div class="history-item">No history available</div>';
+            return;
+        }
+        try {
+            const params = new URLSearchParams({ sessionId: this.initialContext.sessionId });
+            const response = await fetch(`/api/requirements/${encodeURIComponent(req.id)}/history?${params}`);
+            const data = await response.json();
+            historyList.innerHTML = (data.changeHistory || []).map(change => `
+                <div class="history-item">
+                    <span class="history-type">${change.type}</span>
+                    <span class="history-details">${change.details}</span>
+                    <span class="history-time">${new Date(change.timestamp).toLocaleString()}</span>
+                </div>
+            `).join('');
+        } catch (error) {
+            console.error('Error loading requirement history:', error);
+            historyList.innerHTML = '<div class="history-item">Could not load history</div>';
+        }
     }
     
     async initialize(initialRequirements, initialDataset) {
@@ -232,6 +283,11 @@ class RequirementsManager {
             if (data.datasetPath) {
                 this.initialContext.datasetPath = data.datasetPath;
             }
+
+            if (data.sessionId) {
+                this.initialContext.sessionId = data.sessionId;
+            }
+            this.prefetchBlueprint();
         } catch (error) {
             // Hide typing indicator on error
             this.chatManager.hideTypingIndicator();
@@ -249,6 +305,23 @@ class RequirementsManager {
         
         // Scroll to the bottom of the requirements list
         this.requirementsList.scrollTop = this.requirementsList.scrollHeight;
+
+        this.prefetchBlueprint();
+    }
+
+    prefetchBlueprint() {
+        // The server generates the blueprint once the requirements stop changing
+        if (!this.initialContext.sessionId) return;
+        fetch('/api/prefetch/blueprint', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                requirements: this.requirements,
+                sessionId: this.initialContext.sessionId
+            })
+        }).catch(error => console.error('Error prefetching blueprint:', error));
     }
 
     createRequirementElement(req) {
@@ -292,15 +365,7 @@ class RequirementsManager {
                 </div>
                 <div class="change-history hidden">
                     <h4>Change History</h4>
-                    <div class="history-list">
-                        ${(req.changeHistory || []).map(change => `
-                            <div class="history-item">
-                                <span class="history-type">${change.type}</span>
-                                <span class="history-details">${change.details}</span>
-                                <span class="history-time">${new Date(change.timestamp).toLocaleString()}</span>
-                            </div>
-                        `).join('')}
-                    </div>
+                    <div class="history-list"></div>
                 </div>
             </div>
             <button class="delete-requirement">×</button>
@@ -320,14 +385,7 @@ class RequirementsManager {
             const newTitle = titleEl.textContent;
             if (newTitle !== req.title) {
                 this.updateRequirement(req.id, { 
-                    title: newTitle,
-                    dateModified: new Date().toISOString(),
-                    changeHistory: [...(req.changeHistory || []), {
-                        type: 'title_changed',
-                        timestamp: new Date().toISOString(),
-                        userId: this.currentUserId,
-                        details: `Title changed from "${req.title}" to "${newTitle}"`
-                    }]
+                    title: newTitle
                 });
             }
         });
@@ -336,14 +394,7 @@ class RequirementsManager {
             const newDesc = descEl.textContent;
             if (newDesc !== req.description) {
                 this.updateRequirement(req.id, { 
-                    description: newDesc,
-                    dateModified: new Date().toISOString(),
-                    changeHistory: [...(req.changeHistory || []), {
-                        type: 'description_changed',
-                        timestamp: new Date().toISOString(),
-                        userId: this.currentUserId,
-                        details: 'Description updated'
-                    }]
+                    description: newDesc
                 });
             }
         });
@@ -351,28 +402,14 @@ class RequirementsManager {
         importanceSelect.addEventListener('change', () => {
             const newImportance = importanceSelect.value;
             this.updateRequirement(req.id, { 
-                importance: newImportance,
-                dateModified: new Date().toISOString(),
-                changeHistory: [...(req.changeHistory || []), {
-                    type: 'importance_changed',
-                    timestamp: new Date().toISOString(),
-                    userId: this.currentUserId,
-                    details: `Importance changed to ${newImportance}`
-                }]
+                importance: newImportance
             });
         });
 
         categorySelect.addEventListener('change', () => {
             const newCategory = categorySelect.value;
             this.updateRequirement(req.id, { 
-                category: newCategory,
-                dateModified: new Date().toISOString(),
-                changeHistory: [...(req.changeHistory || []), {
-                    type: 'category_changed',
-                    timestamp: new Date().toISOString(),
-                    userId: this.currentUserId,
-                    details: `Category changed to ${newCategory}`
-                }]
+                category: newCategory
             });
         });
 
@@ -381,14 +418,7 @@ class RequirementsManager {
                 const newTag = e.target.value.trim();
                 if (!req.tags.includes(newTag)) {
                     this.updateRequirement(req.id, { 
-                        tags: [...(req.tags || []), newTag],
-                        dateModified: new Date().toISOString(),
-                        changeHistory: [...(req.changeHistory || []), {
-                            type: 'tag_added',
-                            timestamp: new Date().toISOString(),
-                            userId: this.currentUserId,
-                            details: `Tag "${newTag}" added`
-                        }]
+                        tags: [...(req.tags || []), newTag]
                     });
                 }
                 e.target.value = '';
@@ -397,6 +427,9 @@ class RequirementsManager {
 
         historyBtn.addEventListener('click', () => {
             historyPanel.classList.toggle('hidden');
+            if (!historyPanel.classList.contains('hidden')) {
+                this.loadHistory(req, historyPanel.querySelector('.history-list'));
+            }
         });
 
         deleteBtn.addEventListener('click', () => this.deleteRequirement(req.id));
@@ -409,9 +442,8 @@ class RequirementsManager {
         if (index !== -1) {
             const oldReq = this.requirements[index];
             
-            // Create change history entry
+            // Describe the change for the change log
             const changes = Object.entries(updates)
-                .filter(([key]) => key !== 'changeHistory' && key !== 'dateModified')
                 .map(([key, value]) => {
                     if (key === 'tags') {
                         return `tags updated`;
@@ -421,20 +453,13 @@ class RequirementsManager {
                 })
                 .join(', ');
 
-            const historyEntry = {
-                type: 'modified',
-                timestamp: new Date().toISOString(),
-                userId: this.currentUserId,
-                details: changes
-            };
-
             // Update the requirement
             this.requirements[index] = {
                 ...oldReq,
                 ...updates,
-                dateModified: new Date().toISOString(),
-                changeHistory: [...(oldReq.changeHistory || []), historyEntry]
+                dateModified: new Date().toISOString()
             };
+            this.recordChange(this.requirements[index], 'modified', changes);
 
             this.renderRequirements();
         }
@@ -462,6 +487,10 @@ class RequirementsManager {
     }
     
     deleteRequirement(id) {
+        const req = this.requirements.find(r => r.id === id);
+        if (req) {
+            this.recordChange(req, 'removed', 'Requirement removed by user');
+        }
         this.requirements = this.requirements.filter(r => r.id !== id);
         this.renderRequirements();
     }
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Tuple
+
+from werkzeug.utils import secure_filename
+
+from agents.datasets import convert_to_columnar
+
+CHUNK_SIZE = 1024 * 1024
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+
+class UploadSpool:
+    """Scratch file in the upload directory that hashes everything written to it.
+
+    Used as the destination of a multipart file field while the request body is parsed,
+    so an upload reaches disk, hashed, in a single pass. The file is removed on close
+    unless an `UploadStore` has claimed it.
+    """
+
+    def __init__(self, directory: str):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+    def claim(self) -> str:
+        """Close the file and hand over its path; it is no longer removed on close."""
+        self._file.close()
+        path, self.path = self.path, None
+        return path
+
+    def close(self) -> None:
+        self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadStore:
+    """Content-addressed store for uploaded datasets.
+
+    Uploads are written to disk in chunks while being hashed, and stored as
+    <sha256><extension>, so identical uploads share one file and different uploads with
+    the same name never overwrite each other. Uploads parsed into an `UploadSpool` (see
+    `open_spool`) are already on disk and hashed, and are moved into place without another
+    copy. Each new file is converted to columnar sheets once, on ingest.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def open_spool(self) -> UploadSpool:
+        """A scratch file for an upload that is being received."""
+        return UploadSpool(self.directory)
+
+    def save(self, stream: BinaryIO, filename: str) -> str:
+        """Store an upload and return its path."""
+        source_name = secure_filename(filename) or 'dataset'
+        extension = os.path.splitext(source_name)[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValueError("Unsupported file type. Please provide a CSV or Excel file.")
+
+        if isinstance(stream, UploadSpool):
+            hexdigest = stream.hexdigest()
+            temp_path = stream.claim()
+        else:
+            hexdigest, temp_path = self._copy(stream)
+        try:
+            path = os.path.join(self.directory, hexdigest + extension)
+            with self._lock:
+                if os.path.exists(path):
+                    print(f"Upload {source_name} is already stored as {os.path.basename(path)}")
+                    os.remove(temp_path)
+                else:
+                    os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        try:
+            convert_to_columnar(path, source_name)
+        except Exception as e:
+            # Loads fall back to parsing the original file
+            print(f"Error converting {source_name} to columnar sheets: {str(e)}")
+        return path
+
+    def _copy(self, stream: BinaryIO) -> Tuple[str, str]:
+        """Copy a stream to a scratch file in chunks, returning its digest and path."""
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return digest.hexdigest(), temp_path
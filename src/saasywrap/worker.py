@@ -0,0 +1,79 @@
+import argparse
+import multiprocessing
+import os
+from typing import Dict
+
+import openai
+from dotenv import load_dotenv
+
+from agents.generate_blueprint import BlueprintAgent
+from job_queue import JobQueue, Worker
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+# Errors worth another attempt: the model API being unreachable, slow or overloaded
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # Includes timeouts
+    openai.RateLimitError,
+    openai.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class TransformFailed(Exception):
+    """A transform ran but reported failure; running it again would fail the same way."""
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed job should be retried."""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def run_transform(payload: Dict) -> Dict:
+    """Execute one blueprint transform from a queued job."""
+    agent = BlueprintAgent()
+    agent.blueprint = [dict(t) for t in payload.get('blueprint', [])]
+    agent.requirements = payload.get('requirements', [])
+    agent.dataset_path = payload.get('datasetPath')
+    agent.session_id = payload.get('sessionId')
+    result = agent.execute_transform(payload['transformId'], payload.get('previewState', {}))
+    if result.get('status') == 'failed':
+        raise TransformFailed(result.get('message') or 'Transform failed')
+    return result
+
+
+HANDLERS = {
+    'transform': run_transform,
+}
+
+
+def _run_worker() -> None:
+    Worker(JobQueue(), HANDLERS, retryable=is_transient).run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run transform workers against the job queue.")
+    parser.add_argument('--processes', type=int, default=int(os.getenv('JOB_WORKER_PROCESSES', 1)),
+                        help="number of worker processes to run")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_worker()
+        return
+
+    processes = [multiprocessing.Process(target=_run_worker, name=f'job-worker-{i}') for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -53,10 +53,15 @@ conda activate saasywrap
 echo -e "\n${GREEN}🌐 Starting Flask application...${NC}"
 
 # Start Flask app in background
-export FLASK_APP=src/saasywrap/app.py
+# The factory also starts the in-process transform workers
+export FLASK_APP="src/saasywrap/app.py:create_app()"
 export FLASK_ENV=development
 flask run &
 
+# Transform workers share the job queue with the app's in-process workers
+echo -e "${GREEN}⚙️  Starting ${JOB_WORKER_PROCESSES:-2} transform worker processes...${NC}"
+python src/saasywrap/worker.py --processes "${JOB_WORKER_PROCESSES:-2}" &
+
 # Wait for Flask to initialize
 echo -e "${YELLOW}Waiting for Flask to start...${NC}"
 sleep 2
@@ -66,4 +71,4 @@ echo -e "${GREEN}The web application will open in your default browser.${NC}"
 xdg-open http://localhost:5000 2>/dev/null || sensible-browser http://localhost:5000 2>/dev/null || echo -e "${YELLOW}Please open http://localhost:5000 in your browser${NC}"
 
 echo -e "${YELLOW}Press Ctrl+C to stop the server when you're done.${NC}\n"
-echo -e "${YELLOW}To stop the flask server, run: ${CYAN}pkill -f flask${NC}"
+echo -e "${YELLOW}To stop the flask server and workers, run: ${CYAN}pkill -f flask; pkill -f worker.py${NC}"
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'saasywrap'))
+
+# Agents build OpenAI clients when constructed; tests never reach the API
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+# Keep uploads, queues and logs out of the repository
+os.environ['SAASYWRAP_DATA_DIR'] = tempfile.mkdtemp(prefix='saasywrap-tests-')
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import app
+from agents.change_log import ChangeLog
+
+
+def _entry(details, **extra):
+    return dict({'type': 'modified', 'timestamp': '2024-01-01T00:00:00', 'userId': 'u1', 'details': details}, **extra)
+
+
+def test_versions_and_history(tmp_path):
+    log = ChangeLog('s1', log_dir=str(tmp_path))
+    assert log.append('REQ-1', _entry('first')) == 1
+    assert log.append('REQ-2', _entry('other')) == 1
+    assert log.append('REQ-1', _entry('second')) == 2
+    assert log.version('REQ-1') == 2
+    assert log.version('REQ-3') == 0
+    assert [e['details'] for e in log.history('REQ-1')] == ['first', 'second']
+    assert [e['version'] for e in log.history('REQ-1')] == [1, 2]
+
+
+def test_reopen_from_snapshot_and_log_tail(tmp_path):
+    log = ChangeLog('s1', log_dir=str(tmp_path), snapshot_every=5)
+    for i in range(12):
+        log.append(f'REQ-{i % 3}', _entry(f'change {i}'))
+
+    with open(log.snapshot_path) as f:
+        snapshot = json.load(f)
+    # The snapshot holds folded state, not copies of the events
+    assert snapshot['events'] == 10
+    assert 'history' not in snapshot
+    assert snapshot['versions'] == {'REQ-0': 4, 'REQ-1': 3, 'REQ-2': 3}
+
+    reopened = ChangeLog('s1', log_dir=str(tmp_path), snapshot_every=5)
+    for requirement_id in ('REQ-0', 'REQ-1', 'REQ-2'):
+        assert reopened.version(requirement_id) == log.version(requirement_id)
+        assert reopened.history(requirement_id) == log.history(requirement_id)
+    # Only the two events after the snapshot were replayed
+    assert reopened._events == 12 and reopened._snapshot_events == 10
+    assert reopened.append('REQ-0', _entry('after reopen')) == 5
+
+
+def test_unreadable_snapshot_replays_the_whole_log(tmp_path):
+    log = ChangeLog('s1', log_dir=str(tmp_path), snapshot_every=2)
+    for i in range(3):
+        log.append('REQ-1', _entry(f'change {i}'))
+    with open(log.snapshot_path, 'w') as f:
+        f.write('{not json')
+    assert ChangeLog('s1', log_dir=str(tmp_path)).version('REQ-1') == 3
+
+
+def test_event_fields_cannot_be_overwritten(tmp_path):
+    log = ChangeLog('s1', log_dir=str(tmp_path))
+    log.append('REQ-1', _entry('x', requirementId='REQ-9', version=99, extra='dropped'))
+    assert log.history('REQ-1') == [dict(_entry('x'), version=1)]
+    assert log.version('REQ-9') == 0
+
+
+@pytest.mark.parametrize('entry', ['text', ['a'], None, {'type': 'modified'}, {'type': 1, 'details': 'x'}])
+def test_invalid_entries_are_rejected(tmp_path, entry):
+    with pytest.raises(ValueError):
+        ChangeLog('s1', log_dir=str(tmp_path)).append('REQ-1', entry)
+
+
+def test_invalid_session_ids_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ChangeLog('../escape', log_dir=str(tmp_path))
+
+
+def test_history_endpoints_return_400_for_bad_input():
+    client = app.app.test_client()
+    url = '/api/requirements/REQ-1/history'
+    assert client.post(url, json={'sessionId': 'abc', 'entry': 'text'}).status_code == 400
+    assert client.post(url, json=['not', 'an', 'object']).status_code == 400
+    assert client.post(url, json={'sessionId': 'bad id', 'entry': _entry('x')}).status_code == 400
+    assert client.get(url, query_string={'sessionId': 'bad id'}).status_code == 400
+
+    response = client.post(url, json={'sessionId': 'abc', 'entry': _entry('x')})
+    assert response.status_code == 200 and response.json['version'] == 1
+    assert client.get(url, query_string={'sessionId': 'abc'}).json['changeHistory'][0]['details'] == 'x'
+
+
+def test_chat_returns_400_for_bad_session_id():
+    response = app.app.test_client().post('/api/chat/requirements', json={
+        'message': 'hi', 'initialContext': {'sessionId': '../escape'}})
+    assert response.status_code == 400
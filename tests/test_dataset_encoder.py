@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.dataset_encoder import DatasetEncoder
+
+
+def _sheet(rows=500, columns=6, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(100, 200, (rows, columns)), columns=[f'measure_{i}' for i in range(columns)])
+    df['region'] = rng.choice(['north', 'south', 'east'], rows)
+    return df
+
+
+def _table_rows(text):
+    lines = text.splitlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith('Sample rows')) + 2
+    return lines[start:]
+
+
+def test_coverage_rows_survive_a_tight_budget():
+    df = _sheet().astype({'measure_0': float})
+    df.loc[137, 'measure_0'] = 987654
+    df.loc[311, 'measure_1'] = -5
+    df.loc[402, 'measure_0'] = np.nan
+
+    encoder = DatasetEncoder(token_budget=300)
+    text = encoder.encode({'data': encoder.describe(df)})
+    rows = _table_rows(text)
+
+    assert encoder.estimate_tokens(text) <= 300
+    assert len(rows) < encoder.max_sample_rows
+    assert any(row.startswith('987654|') for row in rows)
+    assert any(row.startswith('NULL|') for row in rows)
+    assert any('|-5|' in row for row in rows)
+
+
+def test_rows_are_shown_in_sheet_order():
+    df = _sheet()
+    df['row'] = np.arange(len(df))
+    encoder = DatasetEncoder()
+    rows = _table_rows(encoder.encode({'data': encoder.describe(df)}))
+    numbers = [int(row.split('|')[-1]) for row in rows]
+    assert numbers == sorted(numbers)
+
+
+def test_delimiters_in_column_names_are_escaped():
+    df = pd.DataFrame({'a|b': [1, 2, 3], 'c\nd': ['x', 'y', 'z'], 'e': [4, 5, 6]})
+    encoder = DatasetEncoder()
+    text = encoder.encode({'data': encoder.describe(df)})
+    lines = text.splitlines()
+    header = lines[lines.index(next(l for l in lines if l.startswith('Sample rows'))) + 1]
+    assert header == 'a/b|c d|e'
+    assert all(len(row.split('|')) == 3 for row in _table_rows(text))
+
+
+@pytest.mark.parametrize('sheets,columns', [(10, 150), (1, 400), (40, 5), (3, 20)])
+def test_budget_is_a_cap(sheets, columns):
+    encoder = DatasetEncoder(token_budget=1500)
+    info = {f'Sheet{i}': encoder.describe(_sheet(rows=100, columns=columns, seed=i)) for i in range(sheets)}
+    assert encoder.estimate_tokens(encoder.encode(info)) <= 1500
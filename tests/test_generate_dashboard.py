@@ -0,0 +1,63 @@
+import pandas as pd
+
+from agents.datasets import dataset_content_hash
+from agents.generate_dashboard import RollupStore
+
+METRIC = {'id': 'amount_by_region', 'type': 'sum', 'column': 'amount', 'group_by': 'region'}
+
+
+class CountingAggregate:
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, df):
+        self.rows.append(len(df))
+        grouped = df.groupby('region')['amount']
+        return pd.DataFrame({'count': grouped.count(), 'sum': grouped.sum()})
+
+
+def _sheet(rows, offset=0):
+    return pd.DataFrame({'region': [['north', 'south'][i % 2] for i in range(offset, offset + rows)],
+                         'amount': range(offset, offset + rows)})
+
+
+def test_same_upload_is_served_from_the_store():
+    store, aggregate = RollupStore(), CountingAggregate()
+    first = store.get('h1', 'data', _sheet(10), METRIC, aggregate)
+    assert store.get('h1', 'data', _sheet(10), METRIC, aggregate) is first
+    assert aggregate.rows == [10]
+
+
+def test_appended_rows_are_merged_into_the_prefix_rollup():
+    store, aggregate = RollupStore(), CountingAggregate()
+    store.get('h1', 'data', _sheet(10), METRIC, aggregate)
+    grown = pd.concat([_sheet(10), _sheet(4, offset=10)], ignore_index=True)
+    rollup = store.get('h2', 'data', grown, METRIC, aggregate)
+    assert aggregate.rows == [10, 4]
+    assert rollup['sum'].to_dict() == aggregate(grown)['sum'].to_dict()
+
+
+def test_unrelated_or_edited_uploads_are_aggregated_in_full():
+    store, aggregate = RollupStore(), CountingAggregate()
+    store.get('h1', 'data', _sheet(10), METRIC, aggregate)
+    edited = _sheet(12)
+    edited.loc[3, 'amount'] = 1000
+    store.get('h2', 'data', edited, METRIC, aggregate)
+    store.get('h3', 'other', _sheet(12), METRIC, aggregate)
+    assert aggregate.rows == [10, 12, 12]
+
+
+def test_store_is_bounded():
+    store, aggregate = RollupStore(max_rollups=2), CountingAggregate()
+    for content_hash in ('h1', 'h2', 'h3'):
+        store.get(content_hash, f'sheet-{content_hash}', _sheet(5), METRIC, aggregate)
+    assert [key[0] for key, _ in store._rollups.items()] == ['h2', 'h3']
+
+
+def test_content_hash_of_plain_and_content_addressed_files(tmp_path):
+    first, second = tmp_path / 'a' / 'data.csv', tmp_path / 'b' / 'data.csv'
+    for path, body in ((first, 'x\n1\n'), (second, 'x\n2\n')):
+        path.parent.mkdir()
+        path.write_text(body)
+    assert dataset_content_hash(str(first)) != dataset_content_hash(str(second))
+    assert dataset_content_hash(str(tmp_path / ('0' * 64 + '.xlsx'))) == '0' * 64
@@ -0,0 +1,79 @@
+import pandas as pd
+
+from agents import generate_form
+from agents.generate_form import FormAgent
+from agents.generate_schema import SchemaAgent
+from agents.preview_db import PreviewDatabase
+
+
+def _column(name, sql_type, nullable=False, **extra):
+    return dict({'name': name, 'source_column': name, 'sql_type': sql_type, 'nullable': nullable}, **extra)
+
+
+SCHEMA = {'tables': [
+    {'name': 'customers', 'source_sheet': 'customers', 'primary_key': 'customer_id', 'columns': [
+        _column('customer_id', 'INTEGER'),
+        _column('name', 'VARCHAR(40)'),
+        _column('tier', 'VARCHAR(10)', nullable=True, enum=['gold', '<silver>']),
+    ]},
+    {'name': 'orders', 'source_sheet': 'orders', 'primary_key': 'id', 'columns': [
+        _column('id', 'INTEGER', surrogate=True),
+        _column('customer_id', 'INTEGER'),
+        _column('amount', 'DECIMAL(18,2)'),
+        _column('placed', 'DATE', nullable=True),
+        _column('notes', 'TEXT', nullable=True),
+        _column('paid', 'BOOLEAN'),
+    ], 'foreign_keys': [{'column': 'customer_id', 'references_table': 'customers',
+                         'references_column': 'customer_id'}]},
+]}
+
+
+def test_widgets_follow_column_types():
+    page = FormAgent().render(SCHEMA, fk_options={'orders.customer_id': ['1', '2']})
+    assert '<input id="orders-id" name="id" type="number" readonly placeholder="auto">' in page
+    assert '<input id="orders-amount" name="amount" type="number" required step="0.01">' in page
+    assert '<input id="orders-placed" name="placed" type="date">' in page
+    assert '<textarea id="orders-notes" name="notes" rows="3"></textarea>' in page
+    assert '<input id="orders-paid" name="paid" type="checkbox">' in page
+    assert '<input id="customers-name" name="name" type="text" required maxlength="40">' in page
+    assert ('<select id="orders-customer_id" name="customer_id" required>'
+            '<option value="1">1</option><option value="2">2</option></select>') in page
+    assert '<option value="&lt;silver&gt;">&lt;silver&gt;</option>' in page
+
+
+def test_rendering_is_memoized_and_filters_tables():
+    generate_form._render_page.cache_clear()
+    agent = FormAgent()
+    page = agent.render(SCHEMA, ['customers'])
+    assert agent.render(SCHEMA, ['customers']) is page
+    assert generate_form._render_page.cache_info().hits == 1
+    assert 'data-table="customers"' in page and 'data-table="orders"' not in page
+
+
+def test_overrides_are_escaped():
+    page = FormAgent().render(SCHEMA, ['customers'], overrides={
+        'titles': {'customers': 'Clients & co'}, 'labels': {'customers.name': '<b>Name</b>'}})
+    assert 'Clients &amp; co' in page and '&lt;b&gt;Name&lt;/b&gt;' in page
+
+
+def test_execute_transform_lists_rows_and_options_from_the_preview_database(tmp_path):
+    path = tmp_path / 'shop.xlsx'
+    customers = pd.DataFrame({'customer_id': range(1, 31), 'name': [f'c{i}' for i in range(30)]})
+    orders = pd.DataFrame({'order_id': range(1, 101), 'customer_id': [i % 30 + 1 for i in range(100)],
+                           'amount': [i * 2.5 for i in range(100)]})
+    with pd.ExcelWriter(path) as writer:
+        customers.to_excel(writer, sheet_name='customers', index=False)
+        orders.to_excel(writer, sheet_name='orders', index=False)
+    schema = SchemaAgent().infer_schema({'customers': customers, 'orders': orders})
+    database = PreviewDatabase('forms', db_dir=str(tmp_path / 'dbs'))
+    database.load(schema, str(path))
+
+    agent = FormAgent()
+    options = agent.foreign_key_options(schema, str(path), database)
+    assert options == agent.foreign_key_options(schema, str(path))
+    assert len(options['orders.customer_id']) == 30
+
+    result = agent.execute_transform({'title': 'Order form', 'description': 'Enter orders'}, schema, str(path),
+                                     database=database, polish=False)
+    assert result['status'] == 'completed' and result['previewState']['forms']
+    assert 'srcdoc=' in result['preview']
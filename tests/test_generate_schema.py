@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from agents.datasets import read_sheets
+from agents.generate_schema import SchemaAgent, coerce_series, normalize_keys
+
+
+def test_leading_zero_codes_stay_text():
+    df = pd.DataFrame({'zip': ['01234', '85061', '00501', '10001'] * 10, 'code': ['000123', '4', '12', '7'] * 10})
+    agent = SchemaAgent()
+    assert agent.infer_column(df['zip'])['sql_type'].startswith('VARCHAR')
+    assert agent.infer_column(df['code'])['sql_type'].startswith('VARCHAR')
+    assert coerce_series(df['zip'], agent.infer_column(df['zip'])).iloc[0] == '01234'
+
+
+def test_numbers_written_as_text_are_still_numbers():
+    agent = SchemaAgent()
+    assert agent.infer_column(pd.Series(['0', '10', '250'] * 10))['sql_type'] == 'INTEGER'
+    assert agent.infer_column(pd.Series(['0.5', '1.25', '3'] * 10))['sql_type'] == 'REAL'
+    column = agent.infer_column(pd.Series(['$1,200.50', '$0.99', '($300)'] * 10))
+    assert column['sql_type'] == 'DECIMAL(18,2)'
+    assert 'currency' in column['format']
+
+
+def test_uniqueness_is_checked_on_normalized_keys():
+    ids = [f'A{i}' for i in range(30)]
+    df = pd.DataFrame({'padded': ids[:-1] + [' A0'], 'plain': ids, 'numbers': [str(i) for i in range(29)] + ['1.0']})
+    agent = SchemaAgent()
+    assert not agent.infer_column(df['padded'])['unique']
+    assert agent.infer_column(df['plain'])['unique']
+    assert not agent.infer_column(df['numbers'])['unique']
+
+    table = agent.infer_table('items', df)
+    assert table['primary_key'] == 'plain'
+
+
+def test_normalize_keys_keeps_large_integers_exact():
+    big = 2 ** 53
+    keys = normalize_keys(pd.Series([big, big + 1, big + 2], dtype='int64'))
+    assert len(set(keys.tolist())) == 3
+
+    keys = normalize_keys(pd.Series([1.0, 2.0, np.nan]))
+    assert keys.tolist() == [1, 2, None]
+    assert normalize_keys(pd.Series([' a ', 'b', None])).tolist() == ['a', 'b', None]
+    assert normalize_keys(pd.Series([0.5, 1.0])).tolist() == [0.5, 1.0]
+
+
+def test_foreign_keys_between_sheets():
+    rng = np.random.default_rng(0)
+    customers = pd.DataFrame({'customer_id': np.arange(1, 1001), 'name': [f'c{i}' for i in range(1000)]})
+    orders = pd.DataFrame({
+        'order_id': np.arange(1, 5001),
+        'customer_id': rng.integers(1, 1001, 5000),
+        'quantity': rng.integers(1, 10, 5000),
+        'rating': rng.integers(1, 6, 5000),
+    })
+    schema = SchemaAgent().infer_schema({'customers': customers, 'orders': orders})
+    orders_table = next(t for t in schema['tables'] if t['name'] == 'orders')
+    assert [(fk['column'], fk['references_table']) for fk in orders_table['foreign_keys']] == [
+        ('customer_id', 'customers')]
+
+
+def test_zero_padded_csv_columns_are_read_as_text(tmp_path):
+    path = tmp_path / 'stores.csv'
+    path.write_text('zip,revenue,code\n01234,1.5,7\n85061,2.0,12\n')
+    df = read_sheets(str(path))['data']
+    assert df['zip'].tolist() == ['01234', '85061']
+    assert df['revenue'].dtype == float and df['code'].dtype == 'int64'
+    assert SchemaAgent().infer_column(df['zip'])['sql_type'].startswith('VARCHAR')
@@ -0,0 +1,60 @@
+import pandas as pd
+
+import app
+from agents.generate_view import InstanceIndex
+
+BIG = 2 ** 53
+
+
+def _table(name, key, columns, foreign_keys=()):
+    return {
+        'name': name, 'source_sheet': name, 'primary_key': key,
+        'columns': [{'name': c, 'source_column': c, 'sql_type': t} for c, t in columns],
+        'foreign_keys': [{'column': c, 'references_table': t} for c, t in foreign_keys],
+    }
+
+
+def test_padded_duplicate_keys_resolve_to_the_first_row():
+    schema = {'tables': [_table('items', 'code', [('code', 'VARCHAR(10)'), ('n', 'INTEGER')])]}
+    index = InstanceIndex(schema, {'items': pd.DataFrame({'code': ['A1', ' A1', 'B2'], 'n': [1, 2, 3]})})
+    assert index.position('items', 'A1') == 0
+    assert index.position('items', ' A1 ') == 0
+    assert index.position('items', 'B2') == 2
+    assert index.position('items', 'C3') is None
+
+
+def test_large_integer_ids_stay_distinct():
+    schema = {'tables': [
+        _table('accounts', 'account_id', [('account_id', 'BIGINT')]),
+        _table('events', 'event_id', [('event_id', 'INTEGER'), ('account_id', 'BIGINT')],
+               [('account_id', 'accounts')]),
+    ]}
+    dfs = {
+        'accounts': pd.DataFrame({'account_id': [BIG, BIG + 1, BIG + 2]}),
+        'events': pd.DataFrame({'event_id': [1, 2, 3], 'account_id': [BIG + 1, BIG + 1, BIG + 2]}),
+    }
+    index = InstanceIndex(schema, dfs)
+    assert [index.position('accounts', str(BIG + i)) for i in range(3)] == [0, 1, 2]
+    assert index.position('accounts', f'{BIG + 1:,}') == 1
+
+    account = index.instance('accounts', 1)
+    assert account['children'][0]['total'] == 2
+    event = index.instance('events', 2)
+    assert event['parents'][0]['record'] == {'account_id': BIG + 2}
+
+
+def test_view_instances_returns_4xx_for_bad_input(tmp_path):
+    path = tmp_path / 'items.csv'
+    pd.DataFrame({'code': ['A1', ' A1', 'B2']}).to_csv(path, index=False)
+    schema = {'tables': [_table('data', 'code', [('code', 'VARCHAR(10)')])]}
+    client = app.app.test_client()
+
+    def post(**body):
+        return client.post('/api/view-instances', json=dict({'datasetPath': str(path), 'schema': schema,
+                                                             'table': 'data'}, **body))
+
+    response = post(key='A1')
+    assert response.status_code == 200 and response.json['cursor'] == '0'
+    assert post(key='missing').status_code == 404
+    assert post(table='unknown').status_code == 404
+    assert post(schema={'tables': [{'name': 'data', 'source_sheet': 'data'}]}).status_code == 400
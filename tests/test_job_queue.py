@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from job_queue import COMPLETED, FAILED, QUEUED, RUNNING, JobQueue, Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite'), lease_seconds=0.05, max_attempts=3, retry_delay=0.05)
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue):
+    job_id = queue.submit('transform', {'n': 1})
+    assert queue.claim('w1')['id'] == job_id
+    assert queue.claim('w2') is None
+    time.sleep(0.1)
+
+    job = queue.claim('w2')
+    assert job['id'] == job_id and job['attempts'] == 2
+    assert not queue.complete(job_id, 'w1', 'stale')
+    assert queue.complete(job_id, 'w2', 'done')
+    assert queue.get(job_id)['result'] == 'done'
+
+
+def test_expired_last_attempt_fails_the_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite'), lease_seconds=0.05, max_attempts=1)
+    job_id = queue.submit('transform', {})
+    queue.claim('w1')
+    time.sleep(0.1)
+    assert queue.claim('w2') is None
+    assert queue.get(job_id)['status'] == FAILED
+
+
+def test_failed_attempts_are_retried_with_backoff(queue):
+    job_id = queue.submit('transform', {})
+    queue.claim('w1')
+    assert queue.fail(job_id, 'w1', 'timeout')
+    assert queue.get(job_id)['status'] == QUEUED
+    assert queue.claim('w1') is None
+    time.sleep(0.1)
+    assert queue.claim('w1')['attempts'] == 2
+
+    assert queue.fail(job_id, 'w1', 'bad input', retry=False)
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['error'] == 'bad input'
+
+
+def test_retries_stop_at_max_attempts(queue):
+    job_id = queue.submit('transform', {})
+    for _ in range(3):
+        time.sleep(0.35)
+        assert queue.claim('w1')['id'] == job_id
+        queue.fail(job_id, 'w1', 'timeout')
+    assert queue.get(job_id)['status'] == FAILED
+
+
+def test_submit_is_idempotent_until_the_job_fails(queue):
+    first = queue.submit('transform', {'n': 1}, idempotency_key='k')
+    assert queue.submit('transform', {'n': 1}, idempotency_key='k') == first
+    queue.claim('w1')
+    queue.fail(first, 'w1', 'bad input', retry=False)
+    assert queue.submit('transform', {'n': 2}, idempotency_key='k') == first
+    job = queue.get(first)
+    assert job['status'] == QUEUED and job['attempts'] == 0 and job['payload'] == {'n': 2}
+
+
+def test_worker_fails_non_retryable_errors_at_once(queue):
+    def handler(payload):
+        raise ValueError('bad transform')
+
+    job_id = queue.submit('transform', {})
+    worker = Worker(queue, {'transform': handler}, retryable=lambda e: not isinstance(e, ValueError))
+    assert worker.run_once()
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['attempts'] == 1
+
+
+def test_worker_runs_jobs_until_stopped(queue):
+    job_id = queue.submit('transform', {'n': 2})
+    stop = threading.Event()
+    worker = Worker(queue, {'transform': lambda payload: payload['n'] * 2}, poll_interval=0.01)
+    thread = threading.Thread(target=worker.run, args=(stop,))
+    thread.start()
+    try:
+        job = queue.wait(job_id, timeout=5, interval=0.01)
+    finally:
+        stop.set()
+        thread.join()
+    assert job['status'] == COMPLETED and job['result'] == 4
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite')
+    queue = JobQueue(path, retention_days=1)
+    old, recent, running = (queue.submit('transform', {'n': i}) for i in range(3))
+    for job_id in (old, recent, running):
+        queue.claim('w1')
+    queue.complete(old, 'w1', 'done')
+    queue.complete(recent, 'w1', 'done')
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id IN (?, ?)", (time.time() - 2 * 86400, old, running))
+
+    JobQueue(path, retention_days=1).claim('w2')
+    assert queue.get(old) is None
+    assert queue.get(recent)['status'] == COMPLETED
+    assert queue.get(running)['status'] == RUNNING
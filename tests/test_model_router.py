@@ -0,0 +1,53 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from agents.model_router import ModelRouter
+
+
+class FakeClient:
+    """Answers chat completions with the model name, after a per-call delay."""
+
+    def __init__(self, delays=()):
+        self.calls = []
+        self.delays = list(delays)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        with self._lock:
+            self.calls.append(model)
+            delay = self.delays.pop(0) if self.delays else 0
+        time.sleep(delay)
+        return model
+
+
+def test_invalid_responses_escalate_to_a_stronger_model():
+    router = ModelRouter(routes={'op': 'fast'}, max_escalations=2)
+    client = FakeClient()
+    response, result = router.complete(client, 'op', validate=lambda r: r if r == 'gpt-4o' else None)
+    # fast and standard share a model, so the retry goes straight to strong
+    assert client.calls == ['gpt-4o-mini', 'gpt-4o']
+    assert result == 'gpt-4o'
+    stats = router.stats()
+    assert stats['op:fast']['validity_rate'] == 0 and stats['op:strong']['escalated'] == 1
+
+
+def test_escalation_path_skips_tiers_on_the_same_model():
+    router = ModelRouter(max_escalations=2)
+    assert router._escalation_path('fast') == ['fast', 'strong']
+    router = ModelRouter(tiers={'standard': 'mid-model'}, max_escalations=1)
+    assert router._escalation_path('fast') == ['fast', 'standard']
+    assert ModelRouter(max_escalations=0)._escalation_path('fast') == ['fast']
+
+
+def test_slow_calls_are_hedged_once_latency_history_exists():
+    router = ModelRouter(routes={'op': 'fast'}, hedge_min_samples=3, hedge_percentile=50)
+    client = FakeClient(delays=[0.01, 0.01, 0.01, 1.0, 0.01])
+    for _ in range(3):
+        router.complete(client, 'op')
+    start = time.monotonic()
+    router.complete(client, 'op')
+    assert time.monotonic() - start < 0.5
+    assert len(client.calls) == 5
+    assert router.stats()['op:fast']['hedged'] == 1
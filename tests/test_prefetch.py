@@ -0,0 +1,41 @@
+import time
+
+from prefetch import SpeculativeCache, input_hash
+
+
+def test_input_hash_ignores_key_order():
+    assert input_hash('kind', {'a': 1, 'b': 2}) == input_hash('kind', {'b': 2, 'a': 1})
+    assert input_hash('kind', {'a': 1}) != input_hash('other', {'a': 1})
+
+
+def test_get_serves_prefetched_result_for_same_inputs():
+    cache = SpeculativeCache()
+    cache.prefetch('blueprint', {'r': 1}, lambda: 'prefetched', scope='s1')
+    result, hit = cache.get('blueprint', {'r': 1}, lambda: 'computed', scope='s1')
+    assert (result, hit) == ('prefetched', True)
+
+    result, hit = cache.get('blueprint', {'r': 2}, lambda: 'computed', scope='s1')
+    assert (result, hit) == ('computed', False)
+
+
+def test_new_inputs_evict_the_slot_old_result():
+    cache = SpeculativeCache()
+    cache.get('blueprint', {'r': 1}, lambda: 'old', scope='s1')
+    cache.get('blueprint', {'r': 2}, lambda: 'new', scope='s1')
+    result, hit = cache.get('blueprint', {'r': 1}, lambda: 'recomputed', scope='s1')
+    assert (result, hit) == ('recomputed', False)
+
+
+def test_slots_are_bounded_by_max_entries():
+    cache = SpeculativeCache(max_entries=4)
+    for i in range(50):
+        cache.get('blueprint', {'r': i}, lambda: 'x', scope=f'session-{i}')
+    assert len(cache._entries) == 4
+    assert len(cache._slots) == 4
+
+
+def test_unusable_prefetch_is_discarded():
+    cache = SpeculativeCache()
+    cache.prefetch('blueprint', {'r': 1}, lambda: {}, scope='s1', cacheable=bool)
+    time.sleep(0.1)
+    assert not cache._entries and not cache._slots
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from agents import preview_db
+from agents.generate_schema import SchemaAgent
+from agents.preview_db import PreviewDatabase
+
+
+def test_load_in_batches_and_reuse(tmp_path, monkeypatch):
+    monkeypatch.setattr(preview_db, 'BATCH_SIZE', 7)
+    path = tmp_path / 'stores.csv'
+    pd.DataFrame({
+        'store_id': range(1, 51),
+        'zip': ['01234', '85061'] * 25,
+        'revenue': [float(i) * 1.5 for i in range(50)],
+    }).to_csv(path, index=False)
+    schema = SchemaAgent().infer_schema({'data': pd.read_csv(path, dtype={'zip': str})})
+    table = schema['tables'][0]['name']
+
+    db = PreviewDatabase('s1', db_dir=str(tmp_path / 'dbs'))
+    assert db.load(schema, str(path))
+    assert db.row_counts(schema) == {table: 50}
+    assert [row['zip'] for row in db.query(f'SELECT zip FROM "{table}" ORDER BY store_id LIMIT 2')] == [
+        '01234', '85061']
+    assert not db.load(schema, str(path))
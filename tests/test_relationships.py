@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from agents.relationships import ColumnSketch, RelationshipDetector
+
+
+def test_exact_containment_strips_text_and_matches_whole_floats():
+    codes = ColumnSketch('orders', 'code', pd.Series([' A1', 'A2 ', 'A9']), k=16, exact_limit=100)
+    keys = ColumnSketch('items', 'code', pd.Series(['A1', 'A2', 'A3']), k=16, exact_limit=100)
+    assert codes.containment_in(keys) == 2 / 3
+
+    ids = ColumnSketch('orders', 'id', pd.Series([1.0, 2.0, 2.0]), k=16, exact_limit=100)
+    assert ids.containment_in(ColumnSketch('items', 'id', pd.Series([1, 2, 3]), k=16, exact_limit=100)) == 1.0
+
+
+def test_sketched_containment_estimates_large_columns():
+    keys = pd.Series([f'K{i}' for i in range(20000)])
+    half = pd.Series([f'K{i}' for i in range(0, 20000, 2)] + [f'X{i}' for i in range(10000)])
+    key_sketch = ColumnSketch('keys', 'key', keys, k=256, exact_limit=512)
+    assert key_sketch.members is not None and len(key_sketch.hashes) == 256
+    assert abs(ColumnSketch('refs', 'key', half, k=256, exact_limit=512).containment_in(key_sketch) - 0.5) < 0.1
+
+    plain = ColumnSketch('refs', 'key', keys.iloc[:15000].repeat(2), k=256, exact_limit=512)
+    other = ColumnSketch('other', 'key', keys.iloc[5000:], k=256, exact_limit=512)
+    other.members = None
+    assert abs(plain.containment_in(other) - 2 / 3) < 0.15
+
+
+def test_sequential_keys_need_a_matching_name_or_coverage():
+    rng = np.random.default_rng(1)
+    dfs = {
+        'products': pd.DataFrame({'id': np.arange(1, 501), 'sku': [f'S{i:04d}' for i in range(500)]}),
+        'sales': pd.DataFrame({
+            'product_id': rng.integers(1, 501, 3000),
+            'units': rng.integers(1, 12, 3000),
+            'sku': rng.choice([f' S{i:04d}' for i in range(500)], 3000),
+        }),
+    }
+    found = {(c['table'], c['column']): (c['referenced_table'], c['referenced_column'])
+             for c in RelationshipDetector().detect(dfs)}
+    assert found == {('sales', 'product_id'): ('products', 'id'), ('sales', 'sku'): ('products', 'sku')}
+
+
+def test_preferred_keys_rank_first_and_each_pair_has_one_direction():
+    dfs = {
+        'customers': pd.DataFrame({'customer_id': [f'C{i}' for i in range(50)],
+                                   'email': [f'c{i}@x.io' for i in range(50)]}),
+        'accounts': pd.DataFrame({'customer_id': [f'C{i}' for i in range(50)]}),
+    }
+    detector = RelationshipDetector()
+    candidates = detector.detect(dfs, preferred_keys={'customers': 'customer_id'})
+    assert [(c['table'], c['referenced_table']) for c in candidates] == [('accounts', 'customers')]
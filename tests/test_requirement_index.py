@@ -0,0 +1,66 @@
+from agents.generate_requirements import RequirementsAgent
+from agents.requirement_index import RequirementIndex
+
+REQUIREMENTS = [
+    ('R1', 'Export reports to PDF', 'Users can export any report as a PDF file for sharing', ['export', 'reports']),
+    ('R2', 'Download reports as PDF documents',
+     'Provide a way to download a report in PDF format so it can be shared', ['reports', 'pdf']),
+    ('R3', 'Password reset via email', 'Send a reset link by email when a user forgets their password', ['auth']),
+    ('R4', 'Role-based access control',
+     'Admins assign roles that limit which pages and data each account can see', ['auth', 'security']),
+    ('R5', 'Monthly revenue dashboard', 'Show revenue per month with a chart and totals by region',
+     ['dashboard', 'revenue']),
+    ('R6', 'Import customer data from CSV', 'Upload a CSV file of customers and map its columns to customer fields',
+     ['import', 'customers']),
+    ('R7', 'Audit log of changes', 'Record who changed which record and when, viewable by admins',
+     ['audit', 'security']),
+    ('R8', 'Email notifications for overdue invoices',
+     'Notify the account owner by email when an invoice is past its due date', ['invoices', 'notifications']),
+    ('R9', 'Forgotten password recovery', 'When someone forgets their password, email them a link to reset it',
+     ['authentication']),
+    ('R10', 'Bulk customer upload', 'Let admins upload customers in bulk from a spreadsheet or CSV file',
+     ['customers']),
+]
+
+
+def _requirements():
+    return [{'id': i, 'title': t, 'description': d, 'tags': tags} for i, t, d, tags in REQUIREMENTS]
+
+
+def test_reworded_requirements_are_near_duplicates():
+    index = RequirementIndex()
+    index.update(_requirements())
+    assert sorted((a, b) for a, b, _ in index.near_duplicates()) == [('R1', 'R2'), ('R10', 'R6'), ('R3', 'R9')]
+    assert [(a, b) for a, b, _ in index.near_duplicates(['R9'])] == [('R3', 'R9')]
+    assert RequirementIndex(duplicate_threshold=0.99).near_duplicates() == []
+
+
+def test_search_and_select():
+    index = RequirementIndex(top_k=2)
+    requirements = _requirements()
+    index.update(requirements)
+    assert index.search('invoice overdue email', k=1)[0][0] == 'R8'
+    selected = index.select(requirements, 'revenue chart per region', ['R7'])
+    assert [r['id'] for r in selected] == ['R5', 'R7']
+
+
+def test_update_only_reindexes_changed_requirements():
+    index = RequirementIndex()
+    requirements = _requirements()
+    index.update(requirements)
+    requirements[4] = dict(requirements[4], title='Quarterly profit dashboard')
+    index.update(requirements[:-1])
+    assert 'R10' not in index._docs
+    assert index.search('quarterly profit', k=1)[0][0] == 'R5'
+
+
+def test_duplicate_note_ignores_requirements_missing_from_this_agent():
+    agent = RequirementsAgent()
+    agent.requirements = _requirements()[:3]
+    # A concurrent request indexed requirements this agent does not hold
+    agent.requirement_index.update(_requirements())
+    note = agent._duplicate_note(None)
+    assert '"Export reports to PDF" and "Download reports as PDF documents"' in note
+    assert 'Forgotten password' not in note
+    agent.requirements = _requirements()[2:4]
+    assert agent._duplicate_note(None) == ''
@@ -0,0 +1,24 @@
+import pytest
+
+from agents.session_registry import SessionRegistry
+
+
+def test_keeps_the_most_recently_used_sessions():
+    registry = SessionRegistry(max_sessions=2)
+    first = registry.get('a', lambda s: object())
+    registry.get('b', lambda s: object())
+    assert registry.get('a', lambda s: object()) is first
+    registry.get('c', lambda s: object())
+    assert list(registry._items) == ['a', 'c']
+    assert registry.get('b', lambda s: 'rebuilt') == 'rebuilt'
+
+
+def test_factory_errors_are_not_cached():
+    registry = SessionRegistry(max_sessions=2)
+
+    def fail(session_id):
+        raise ValueError(session_id)
+
+    with pytest.raises(ValueError):
+        registry.get('x', fail)
+    assert not registry._items
@@ -0,0 +1,48 @@
+import threading
+
+import app
+
+REQUIREMENTS = [
+    {'id': 'REQ-1', 'title': 'Customer orders form', 'description': 'Enter customer orders with quantities'},
+    {'id': 'REQ-2', 'title': 'Order history', 'description': 'Customers can see their order history'},
+    {'id': 'REQ-3', 'title': 'Order totals', 'description': 'Show totals for each customer order'},
+    {'id': 'REQ-4', 'title': 'Login', 'description': 'Sign in with email and password'},
+    {'id': 'REQ-5', 'title': 'Password reset', 'description': 'Reset a forgotten password by email'},
+]
+TRANSFORM = {'id': 'T1', 'title': 'Order entry form', 'description': 'Form for customer orders',
+             'transform_type': 'form', 'requirement_ids': ['REQ-1'], 'dependencies': []}
+
+
+def _key(requirements, preview_state=None, dataset_path='uploads/data.xlsx'):
+    preview_state = app._state_read_by(TRANSFORM, preview_state or {}, dataset_path)
+    return app.input_hash('transform', app._transform_inputs(TRANSFORM, requirements, preview_state,
+                                                             dataset_path, 'session'))
+
+
+def test_key_ignores_preview_state_a_local_transform_does_not_read():
+    assert _key(REQUIREMENTS) == _key(REQUIREMENTS, {'forms': ['orders'], 'dashboard': ['m1']})
+    assert _key(REQUIREMENTS) != _key(REQUIREMENTS, {'schema': {'tables': []}})
+
+
+def test_key_covers_related_requirements_in_the_prompt():
+    related = [dict(r, description=r['description'] + ' and discounts') if r['id'] == 'REQ-3' else r
+               for r in REQUIREMENTS]
+    assert _key(REQUIREMENTS) != _key(related)
+
+
+def test_key_ignores_unrelated_requirements():
+    unrelated = [dict(r, description='Reset a password by text message') if r['id'] == 'REQ-5' else r
+                 for r in REQUIREMENTS]
+    assert _key(REQUIREMENTS) == _key(unrelated)
+
+
+def test_importing_the_app_starts_no_workers():
+    assert not [t for t in threading.enumerate() if t.name.startswith('job-worker')]
+
+
+def test_execute_returns_the_job_id_while_it_runs(monkeypatch):
+    monkeypatch.setitem(app.app.config, 'JOB_WAIT_SECONDS', 0.1)
+    response = app.app.test_client().post('/api/execute-blueprint-transform', json={
+        'transformId': 'T1', 'blueprint': [TRANSFORM], 'requirements': REQUIREMENTS, 'sessionId': 'jobs'})
+    assert response.json['status'] == 'in_progress'
+    assert app.job_queue.get(response.json['jobId'])['status'] == 'queued'
@@ -0,0 +1,64 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from agents import datasets
+from agents.datasets import COLUMNAR_SUFFIX, load_dataset, read_sheets
+from upload_store import UploadStore
+
+CSV = b'id,name\n1,a\n2,b\n'
+
+
+def test_identical_uploads_share_one_file(tmp_path):
+    store = UploadStore(str(tmp_path), chunk_size=4)
+    first = store.save(io.BytesIO(CSV), 'data.csv')
+    assert os.path.basename(first) == hashlib.sha256(CSV).hexdigest() + '.csv'
+    assert store.save(io.BytesIO(CSV), 'copy.csv') == first
+    assert store.save(io.BytesIO(CSV + b'3,c\n'), 'data.csv') != first
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+    assert os.path.exists(os.path.join(first + COLUMNAR_SUFFIX, 'manifest.json'))
+
+
+def test_spooled_uploads_are_moved_into_place(tmp_path):
+    store = UploadStore(str(tmp_path))
+    spool = store.open_spool()
+    spool.write(CSV[:5])
+    spool.write(CSV[5:])
+    path = store.save(spool, 'data.csv')
+    spool.close()
+    assert os.path.basename(path) == hashlib.sha256(CSV).hexdigest() + '.csv'
+    with open(path, 'rb') as f:
+        assert f.read() == CSV
+
+    discarded = store.open_spool()
+    discarded.write(CSV)
+    discarded.close()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+
+def test_unsupported_files_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        UploadStore(str(tmp_path)).save(io.BytesIO(b'x'), 'notes.txt')
+    assert not os.listdir(tmp_path)
+
+
+def test_columnar_sheets_load_exactly_as_parsed(tmp_path, monkeypatch):
+    path = tmp_path / 'mixed.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'code': [1, 'A2', 3.5], 'when': pd.to_datetime(['2024-01-01', None, '2024-03-01'])}).to_excel(
+            writer, sheet_name='mixed', index=False)
+        pd.DataFrame({1: [1, 2], 'name': ['x', None]}).to_excel(writer, sheet_name='plain', index=False)
+    parsed = read_sheets(str(path))
+
+    with open(path, 'rb') as f:
+        stored = UploadStore(str(tmp_path / 'uploads')).save(f, 'mixed.xlsx')
+    # Loads must come from the columnar files, not from parsing the spreadsheet again
+    monkeypatch.setattr(datasets, 'read_sheets', lambda p: pytest.fail('re-parsed the upload'))
+    loaded = load_dataset(stored)
+    assert list(loaded) == list(parsed)
+    for name, df in parsed.items():
+        pd.testing.assert_frame_equal(loaded[name], df)
+    assert [type(v) for v in loaded['mixed']['code']] == [int, str, float]